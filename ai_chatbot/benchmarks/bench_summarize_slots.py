@@ -0,0 +1,170 @@
+"""Micro-benchmark: summarize_slots vs. the previous per-slot-parsing implementation.
+
+The speedup needs a cached SlotIndex (what get_slot_index returns). A raw slot list is
+parsed and indexed on every call, which runs at roughly the old speed and can be slower.
+
+Run from the ai_chatbot directory:
+
+    python benchmarks/bench_summarize_slots.py [--resources 3] [--days 7] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from reservio import ZoneInfo, build_slot_index, summarize_slots  # noqa: E402
+
+
+# Previous implementation, kept verbatim for comparison
+def legacy_summarize_slots(
+    slots: List[Dict[str, Any]],
+    limit: int = 10,
+    timezone: Optional[str] = None,
+    min_duration_minutes: Optional[int] = None,
+    not_before_utc: Optional[datetime] = None,
+    open_hour_local: Optional[int] = None,
+    close_hour_local: Optional[int] = None,
+    annotate_last_start: bool = False,
+) -> str:
+    if not slots:
+        return "No available booking slots were found in the requested window."
+
+    # Deduplicate by exact start/end to avoid duplicates across resources
+    unique: Dict[str, Dict[str, Any]] = {}
+    for item in slots:
+        attributes = item.get("attributes", {})
+        start_iso = attributes.get("start")
+        end_iso = attributes.get("end")
+        if not start_iso or not end_iso:
+            continue
+        key = f"{start_iso}|{end_iso}"
+        if key not in unique:
+            unique[key] = attributes
+
+    # Sort by start time
+    def parse_iso(dt_str: str) -> datetime:
+        # datetime.fromisoformat supports "+02:00" offsets
+        return datetime.fromisoformat(dt_str)
+
+    tzinfo = None
+    if timezone:
+        try:
+            tzinfo = ZoneInfo(timezone) if ZoneInfo is not None else None
+        except Exception:
+            tzinfo = None
+
+    sorted_items = sorted(unique.values(), key=lambda a: parse_iso(a["start"]))
+
+    lines: List[str] = []
+    kept_local_times: List[tuple] = []  # (start_local_dt, end_local_dt)
+    for attributes in sorted_items:
+        start_dt = parse_iso(attributes["start"])  # aware
+        end_dt = parse_iso(attributes["end"])      # aware
+        # Skip slots that start before not_before_utc; compare in UTC
+        if isinstance(not_before_utc, datetime):
+            # Convert both datetimes to UTC using a robust fallback if tzdata is unavailable
+            try:
+                from datetime import timezone as dt_timezone
+                utc = ZoneInfo("UTC") if ZoneInfo is not None else dt_timezone.utc
+            except Exception:
+                from datetime import timezone as dt_timezone
+                utc = dt_timezone.utc
+
+            start_dt_utc = start_dt.astimezone(utc)
+            nbu = not_before_utc
+            if nbu.tzinfo is None:
+                nbu = nbu.replace(tzinfo=utc)
+            else:
+                nbu = nbu.astimezone(utc)
+            if start_dt_utc < nbu:
+                continue
+        # Filter by minimum duration if provided
+        if isinstance(min_duration_minutes, int) and min_duration_minutes > 0:
+            total_minutes = int((end_dt - start_dt).total_seconds() // 60)
+            if total_minutes < min_duration_minutes:
+                continue
+        if tzinfo is not None:
+            start_dt = start_dt.astimezone(tzinfo)
+            end_dt = end_dt.astimezone(tzinfo)
+        # Filter by business hours if provided (local time comparisons)
+        if isinstance(open_hour_local, int) and isinstance(close_hour_local, int):
+            if not (0 <= open_hour_local <= 23 and 0 <= close_hour_local <= 23):
+                pass
+            else:
+                # Require slot fully within [open, close]
+                if start_dt.hour < open_hour_local:
+                    continue
+                if end_dt.hour > close_hour_local or (end_dt.hour == close_hour_local and end_dt.minute > 0):
+                    continue
+        # Display AM/PM for clarity
+        start_str = start_dt.strftime("%I:%M %p").lstrip('0')
+        end_str = end_dt.strftime("%I:%M %p").lstrip('0')
+        kept_local_times.append((start_dt, end_dt))
+        lines.append(f"- {start_str}–{end_str}")
+        if len(lines) >= limit:
+            break
+
+    if not lines:
+        return "Slots data available but could not be parsed."
+    if annotate_last_start and kept_local_times:
+        last_start = kept_local_times[-1][0]
+        # annotate last line
+        lines[-1] = lines[-1] + " (last start today)"
+    return "Here are some available times (Europe/Prague):\n" + "\n".join(lines)
+
+
+def make_slots(resources: int, days: int, step_minutes: int = 15) -> List[Dict[str, Any]]:
+    """Slots every step_minutes around the clock, duplicated once per resource, with +02:00 offsets."""
+    prague = dt_timezone(timedelta(hours=2))
+    base = datetime.now(prague).replace(hour=0, minute=0, second=0, microsecond=0)
+    slots: List[Dict[str, Any]] = []
+    for _ in range(resources):
+        t = base
+        while t < base + timedelta(days=days):
+            slots.append({"attributes": {
+                "start": t.isoformat(timespec="seconds"),
+                "end": (t + timedelta(minutes=30)).isoformat(timespec="seconds"),
+            }})
+            t += timedelta(minutes=step_minutes)
+    return slots
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resources", type=int, default=3)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    slots = make_slots(args.resources, args.days)
+    kwargs = dict(
+        timezone="Europe/Prague",
+        min_duration_minutes=30,
+        not_before_utc=datetime.now(dt_timezone.utc) + timedelta(days=1),
+        open_hour_local=8,
+        close_hour_local=16,
+    )
+    index = build_slot_index(slots)
+    for limit in (5, 50):
+        assert legacy_summarize_slots(slots, limit=limit, **kwargs) == summarize_slots(slots, limit=limit, **kwargs)
+        assert summarize_slots(index, limit=limit, **kwargs) == summarize_slots(slots, limit=limit, **kwargs)
+
+    print(f"{len(slots)} slots ({args.resources} resources x {args.days} days), {args.repeat} runs each")
+    for limit in (5, 50):
+        legacy = timeit.timeit(lambda: legacy_summarize_slots(slots, limit=limit, **kwargs), number=args.repeat)
+        fresh = timeit.timeit(lambda: summarize_slots(slots, limit=limit, **kwargs), number=args.repeat)
+        cached = timeit.timeit(lambda: summarize_slots(index, limit=limit, **kwargs), number=args.repeat)
+        per_run = 1000.0 / args.repeat
+        print(f"limit={limit:<3} legacy {legacy * per_run:8.3f} ms"
+              f" | new (raw list, parse+index) {fresh * per_run:8.3f} ms ({legacy / fresh:5.1f}x)"
+              f" | new (cached index) {cached * per_run:8.3f} ms ({legacy / cached:5.1f}x)")
+    build = timeit.timeit(lambda: build_slot_index(slots), number=args.repeat)
+    print(f"build_slot_index {build * per_run:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
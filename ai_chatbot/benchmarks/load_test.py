@@ -0,0 +1,301 @@
+"""Offline load test of POST /whatsapp against local Reservio/OpenAI/Twilio stand-ins.
+
+Starts the mock upstreams in this process, the app under uvicorn in a subprocess (SQLite
+by default, or --db-url for a local Postgres), replays multi-turn conversation scripts at
+the target concurrency and reports p50/p95/p99 latency and messages per second.
+No network access needed. Run from the ai_chatbot directory:
+
+    python benchmarks/load_test.py --conversations 200 --concurrency 20
+    python benchmarks/load_test.py --async-mode inprocess --env WORKER_COUNT=8
+    python benchmarks/load_test.py --script my_conversations.json --env BURST_DEBOUNCE_SECONDS=0
+    python benchmarks/load_test.py --server gunicorn --app-workers 4 --shared-state
+
+A script file is a JSON list of conversations, each a list of messages.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import httpx
+import uvicorn
+from twilio.request_validator import RequestValidator
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_upstreams import MockState, add_arguments, build_app, config_from_args  # noqa: E402
+from resp_server import RespServer  # noqa: E402
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Sent to the app so /metrics can be scraped (admin endpoints are closed without a token)
+ADMIN_TOKEN = "bench-admin"
+# Webhooks are signed like Twilio does, so the app's signature check stays on the measured path
+TWILIO_AUTH_TOKEN = "bench"
+TWILIO_NUMBER = "whatsapp:+14155238886"
+
+# Typical booking conversations: structured turns (router/cache paths) and free text (LLM path)
+DEFAULT_SCRIPTS: List[List[str]] = [
+    ["hi", "1", "more", "tomorrow", "10:00 AM works for me, my name is Jan Novák"],
+    ["hello", "2", "today", "more"],
+    ["ahoj", "Pánský střih", "tomorrow", "Can I come a bit later than that?"],
+    ["Hi, I need a haircut and a beard trim sometime this week, what do you have?", "3", "more"],
+    ["hey", "1", "What's the difference between the services?", "tomorrow", "more"],
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def stage_means(metrics_text: str) -> Dict[str, float]:
+    """Mean milliseconds per stage from the app's /metrics histograms."""
+    sums: Dict[str, float] = {}
+    counts: Dict[str, float] = {}
+    for line in metrics_text.splitlines():
+        m = re.match(r'wabot_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} ([0-9.eE+-]+)', line)
+        if m:
+            (sums if m.group(1) == "sum" else counts)[m.group(2)] = float(m.group(3))
+    return {stage: sums[stage] / counts[stage] * 1000 for stage in sums if counts.get(stage)}
+
+
+async def wait_for_app(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    give_up = time.monotonic() + timeout
+    while time.monotonic() < give_up:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app exited with code {proc.returncode} during startup")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("app did not become ready")
+
+
+async def run_conversation(
+    client: httpx.AsyncClient,
+    state: MockState,
+    index: int,
+    script: List[str],
+    args: argparse.Namespace,
+    results: Dict[str, Any],
+) -> None:
+    user = f"whatsapp:+4207{index:08d}"
+    signer = RequestValidator(TWILIO_AUTH_TOKEN)
+    url = str(client.base_url).rstrip("/") + "/whatsapp"
+    for turn, body in enumerate(script):
+        form = {
+            "From": user,
+            "To": TWILIO_NUMBER,
+            "Body": body,
+            "MessageSid": f"SMbench{index:08d}{turn:04d}",
+        }
+        sent_at = time.monotonic()
+        try:
+            resp = await client.post("/whatsapp", data=form, headers={
+                "X-Twilio-Signature": signer.compute_signature(url, form),
+            })
+            ok = resp.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        results["webhook"].append(time.monotonic() - sent_at)
+        if not ok:
+            results["errors"] += 1
+            continue
+        results["messages"] += 1
+        if args.async_mode:
+            # Like a real user, wait for the reply (sent through the Twilio mock) before typing again
+            give_up = sent_at + args.reply_timeout
+            while len(state.sent.get(user, [])) <= turn and time.monotonic() < give_up:
+                await asyncio.sleep(0.01)
+            arrivals = state.sent.get(user, [])
+            if len(arrivals) > turn:
+                results["reply"].append(arrivals[turn] - sent_at)
+            else:
+                results["reply_timeouts"] += 1
+        if args.think_time_ms:
+            await asyncio.sleep(args.think_time_ms / 1000)
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    scripts = DEFAULT_SCRIPTS
+    if args.script:
+        with open(args.script, encoding="utf-8") as f:
+            scripts = json.load(f)
+
+    state = MockState()
+    mock_server = uvicorn.Server(uvicorn.Config(
+        build_app(config_from_args(args), state), host="127.0.0.1", port=args.mock_port, log_level="warning",
+    ))
+    mock_task = asyncio.ensure_future(mock_server.serve())
+    while not mock_server.started:
+        await asyncio.sleep(0.05)
+
+    resp = None
+    resp_server = None
+    if args.shared_state:
+        resp = RespServer()
+        resp_server = await resp.start("127.0.0.1", args.resp_port)
+
+    tmp_dir = tempfile.mkdtemp(prefix="wabot-bench-")
+    mock_base = f"http://127.0.0.1:{args.mock_port}"
+    env = dict(os.environ)
+    env.update({
+        "NEON_DB_URL": args.db_url or f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{mock_base}/openai/v1",
+        "RESERVIO_BASE_URL": f"{mock_base}/reservio",
+        "RESERVIO_BUSINESS_ID": "bench-business",
+        "TWILIO_API_BASE": f"{mock_base}/twilio",
+        "TWILIO_ACCOUNT_SID": "ACbench",
+        "TWILIO_AUTH_TOKEN": TWILIO_AUTH_TOKEN,
+        "TWILIO_WHATSAPP_FROM": TWILIO_NUMBER,
+        "WORKER_QUEUE_PATH": os.path.join(tmp_dir, "queue.db"),
+        "LOG_LEVEL": "WARNING",
+        "ASYNC_REPLY_MODE": args.async_mode or "",
+    })
+    env["ADMIN_TOKEN"] = ADMIN_TOKEN
+    env.pop("STATE_BACKEND_URL", None)
+    if resp is not None:
+        env["STATE_BACKEND_URL"] = f"redis://127.0.0.1:{args.resp_port}/0"
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    subprocess.run([sys.executable, "-c", "import db; db.init_db()"], cwd=APP_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    if args.server == "gunicorn":
+        env["WEB_CONCURRENCY"] = str(args.app_workers)
+        app_cmd = [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+                   "--bind", f"127.0.0.1:{args.app_port}", "--log-level", "warning"]
+    else:
+        app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+                   "--log-level", "warning", "--workers", str(args.app_workers)]
+    app_proc = subprocess.Popen(app_cmd, cwd=APP_DIR, env=env)
+    worker_proc = None
+    if args.async_mode == "process":
+        worker_proc = subprocess.Popen([sys.executable, "workers.py"], cwd=APP_DIR, env=env)
+
+    results: Dict[str, Any] = {"webhook": [], "reply": [], "messages": 0, "errors": 0, "reply_timeouts": 0}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", limits=limits,
+                                     timeout=args.request_timeout) as client:
+            await wait_for_app(client, app_proc)
+            if args.warmup:
+                await run_conversation(client, state, 99999999, scripts[0], args, {
+                    "webhook": [], "reply": [], "messages": 0, "errors": 0, "reply_timeouts": 0,
+                })
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def limited(i: int) -> None:
+                async with semaphore:
+                    await run_conversation(client, state, i, scripts[i % len(scripts)], args, results)
+
+            started = time.monotonic()
+            await asyncio.gather(*(limited(i) for i in range(args.conversations)))
+            elapsed = time.monotonic() - started
+            metrics_text = (await client.get("/metrics", headers={"X-Admin-Token": ADMIN_TOKEN})).text if args.app_workers == 1 else ""
+    finally:
+        for proc in (worker_proc, app_proc):
+            if proc is not None and proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        mock_server.should_exit = True
+        await mock_task
+        if resp_server is not None:
+            resp_server.close()
+
+    report: Dict[str, Any] = {
+        "conversations": args.conversations,
+        "concurrency": args.concurrency,
+        "mode": args.async_mode or "inline",
+        "server": f"{args.server} x{args.app_workers}",
+        "messages": results["messages"],
+        "errors": results["errors"],
+        "elapsed_seconds": elapsed,
+        "messages_per_second": results["messages"] / elapsed if elapsed else 0.0,
+        "webhook_latency": summarize(results["webhook"]),
+        "upstream_calls": dict(state.calls),
+    }
+    if args.async_mode:
+        report["reply_latency"] = summarize(results["reply"])
+        report["reply_timeouts"] = results["reply_timeouts"]
+    if resp is not None:
+        report["shared_state_commands"] = resp.commands
+    if metrics_text:
+        report["stage_mean_ms"] = stage_means(metrics_text)
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"mode={report['mode']} server={report['server']} conversations={report['conversations']} concurrency={report['concurrency']}")
+    print(f"messages: {report['messages']}  errors: {report['errors']}  "
+          f"elapsed: {report['elapsed_seconds']:.2f}s  throughput: {report['messages_per_second']:.1f} msg/s")
+    for name in ("webhook_latency", "reply_latency"):
+        if name in report:
+            s = report[name]
+            print(f"{name:16s} p50 {s['p50_ms']:8.1f} ms  p95 {s['p95_ms']:8.1f} ms  "
+                  f"p99 {s['p99_ms']:8.1f} ms  max {s['max_ms']:8.1f} ms")
+    if report.get("reply_timeouts"):
+        print(f"reply timeouts: {report['reply_timeouts']}")
+    for stage, mean_ms in sorted(report.get("stage_mean_ms", {}).items()):
+        print(f"  stage {stage:20s} mean {mean_ms:8.1f} ms")
+    if "shared_state_commands" in report:
+        print(f"shared state commands: {report['shared_state_commands']}")
+    print("upstream calls: " + ", ".join(f"{k}={v}" for k, v in sorted(report["upstream_calls"].items())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10, help="conversations in flight at once")
+    parser.add_argument("--script", help="JSON file: list of conversations, each a list of messages")
+    parser.add_argument("--think-time-ms", type=float, default=0.0, help="pause between a user's messages")
+    parser.add_argument("--async-mode", choices=["inprocess", "process"], help="run the app with ASYNC_REPLY_MODE")
+    parser.add_argument("--server", choices=["uvicorn", "gunicorn"], default="uvicorn",
+                        help="gunicorn runs gunicorn.conf.py with WEB_CONCURRENCY=--app-workers")
+    parser.add_argument("--app-workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--shared-state", action="store_true",
+                        help="run the RESP stand-in (resp_server.py) and point STATE_BACKEND_URL at it")
+    parser.add_argument("--resp-port", type=int, default=9200)
+    parser.add_argument("--db-url", help="database URL (default: a fresh SQLite file)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra app environment")
+    parser.add_argument("--app-port", type=int, default=9001)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--reply-timeout", type=float, default=30.0)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--json", help="also write the report to this file")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
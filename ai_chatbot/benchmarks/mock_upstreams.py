@@ -0,0 +1,195 @@
+"""Local stand-ins for Reservio, OpenAI and Twilio, with configurable latency and payload size.
+
+Used by load_test.py; can also run on its own for manual testing:
+
+    python benchmarks/mock_upstreams.py --port 9100 --openai-latency-ms 600
+
+then point the app at it:
+
+    RESERVIO_BASE_URL=http://127.0.0.1:9100/reservio
+    OPENAI_BASE_URL=http://127.0.0.1:9100/openai/v1
+    TWILIO_API_BASE=http://127.0.0.1:9100/twilio
+"""
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse
+
+SERVICE_NAMES = ["Pánský střih", "Vousy", "Střih + vousy", "Dětský střih", "Barvení", "Holení břitvou"]
+
+
+@dataclass
+class MockConfig:
+    reservio_latency_ms: float = 80.0
+    openai_latency_ms: float = 600.0
+    twilio_latency_ms: float = 50.0
+    jitter: float = 0.2                # +/- fraction of each latency
+    services: int = 5
+    slot_minutes: int = 30             # one slot every N minutes during opening hours
+    resources: int = 1                 # duplicate each slot per resource (bigger payloads)
+    reply_chars: int = 300
+    error_rate: float = 0.0            # fraction of Reservio/OpenAI calls answered with HTTP 503
+
+
+@dataclass
+class MockState:
+    calls: Dict[str, int] = field(default_factory=dict)
+    # Twilio REST messages received per recipient: arrival times (time.monotonic())
+    sent: Dict[str, List[float]] = field(default_factory=dict)
+
+
+async def _delay(latency_ms: float, jitter: float) -> None:
+    if latency_ms > 0:
+        spread = latency_ms * jitter
+        await asyncio.sleep(max(0.0, random.uniform(latency_ms - spread, latency_ms + spread)) / 1000)
+
+
+def _parse_utc(value: Optional[str], default: datetime) -> datetime:
+    if not value:
+        return default
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _slots(cfg: MockConfig, start: datetime, end: datetime) -> List[Dict[str, object]]:
+    # Opening hours 7:00-15:00 UTC cover 8:00-16:00 Europe/Prague in winter and 9:00-17:00 in summer
+    data: List[Dict[str, object]] = []
+    step = timedelta(minutes=cfg.slot_minutes)
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= end:
+        slot = day.replace(hour=7)
+        close = day.replace(hour=15)
+        while slot < close:
+            if start <= slot <= end:
+                for resource in range(cfg.resources):
+                    data.append({
+                        "type": "bookingSlot",
+                        "attributes": {
+                            "start": slot.isoformat(),
+                            "end": (slot + step).isoformat(),
+                            "resourceId": f"res{resource + 1}",
+                        },
+                    })
+            slot += step
+        day += timedelta(days=1)
+    return data
+
+
+def build_app(cfg: MockConfig, state: Optional[MockState] = None) -> FastAPI:
+    state = state or MockState()
+    app = FastAPI()
+    app.state.mock = state
+
+    def count(name: str) -> None:
+        state.calls[name] = state.calls.get(name, 0) + 1
+
+    def failing() -> bool:
+        return cfg.error_rate > 0 and random.random() < cfg.error_rate
+
+    @app.get("/reservio/businesses/{business_id}")
+    async def business(business_id: str):
+        count("reservio_business")
+        await _delay(cfg.reservio_latency_ms, cfg.jitter)
+        if failing():
+            return JSONResponse({"errors": [{"status": "503"}]}, status_code=503)
+        return {"data": {"id": business_id, "attributes": {"name": "Benchmark Barber", "settings": {"timezone": "Europe/Prague"}}}}
+
+    @app.get("/reservio/businesses/{business_id}/services")
+    async def services(business_id: str):
+        count("reservio_services")
+        await _delay(cfg.reservio_latency_ms, cfg.jitter)
+        if failing():
+            return JSONResponse({"errors": [{"status": "503"}]}, status_code=503)
+        return {"data": [
+            {
+                "id": f"svc{i + 1}",
+                "type": "service",
+                "attributes": {"name": SERVICE_NAMES[i % len(SERVICE_NAMES)], "duration": 1800 if i % 2 == 0 else 900},
+            }
+            for i in range(cfg.services)
+        ]}
+
+    @app.get("/reservio/businesses/{business_id}/availability/booking-slots")
+    async def booking_slots(business_id: str, request: Request):
+        count("reservio_slots")
+        await _delay(cfg.reservio_latency_ms, cfg.jitter)
+        if failing():
+            return JSONResponse({"errors": [{"status": "503"}]}, status_code=503)
+        now = datetime.now(timezone.utc)
+        start = _parse_utc(request.query_params.get("filter[from]"), now)
+        end = _parse_utc(request.query_params.get("filter[to]"), now + timedelta(days=7))
+        return {"data": _slots(cfg, start, end)}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        count("openai")
+        payload = await request.json()
+        await _delay(cfg.openai_latency_ms, cfg.jitter)
+        if failing():
+            return JSONResponse({"error": {"message": "overloaded", "type": "server_error"}}, status_code=503)
+        prompt_chars = sum(len(m.get("content") or "") for m in payload.get("messages", []))
+        text = ("Sure! Here are a few options for your haircut. " * 20)[: cfg.reply_chars]
+        return {
+            "id": f"chatcmpl-{state.calls['openai']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(text) // 4, "total_tokens": (prompt_chars + len(text)) // 4},
+        }
+
+    @app.post("/twilio/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def twilio_messages(account_sid: str, To: str = Form(...), From: str = Form(...), Body: str = Form(...)):
+        count("twilio")
+        await _delay(cfg.twilio_latency_ms, cfg.jitter)
+        state.sent.setdefault(To, []).append(time.monotonic())
+        return JSONResponse({"sid": f"SM{state.calls['twilio']:032d}", "status": "queued", "to": To, "from": From}, status_code=201)
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": state.calls, "recipients": len(state.sent)}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockConfig()
+    parser.add_argument("--reservio-latency-ms", type=float, default=defaults.reservio_latency_ms)
+    parser.add_argument("--openai-latency-ms", type=float, default=defaults.openai_latency_ms)
+    parser.add_argument("--twilio-latency-ms", type=float, default=defaults.twilio_latency_ms)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="+/- fraction of each latency")
+    parser.add_argument("--services", type=int, default=defaults.services)
+    parser.add_argument("--slot-minutes", type=int, default=defaults.slot_minutes)
+    parser.add_argument("--resources", type=int, default=defaults.resources, help="slots are repeated per resource")
+    parser.add_argument("--reply-chars", type=int, default=defaults.reply_chars)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        reservio_latency_ms=args.reservio_latency_ms,
+        openai_latency_ms=args.openai_latency_ms,
+        twilio_latency_ms=args.twilio_latency_ms,
+        jitter=args.jitter,
+        services=args.services,
+        slot_minutes=args.slot_minutes,
+        resources=args.resources,
+        reply_chars=args.reply_chars,
+        error_rate=args.error_rate,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock Reservio/OpenAI/Twilio upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(build_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,180 @@
+"""Minimal Redis-protocol stand-in for local multi-worker runs and load tests.
+
+Supports what state.RedisStore uses (GET, SET with EX/PX/NX, DEL, RPUSH, LRANGE, PEXPIRE,
+MULTI/EXEC) plus PING, EXISTS and FLUSHALL; connection setup (HELLO, CLIENT, SELECT) is acknowledged. Speaks RESP2, or RESP3
+after `HELLO 3` (redis-py 6+ asks for it on connect). Not for production.
+
+    python benchmarks/resp_server.py --port 6399
+    STATE_BACKEND_URL=redis://127.0.0.1:6399/0 gunicorn main:app -c gunicorn.conf.py
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+
+_WRONGTYPE = b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n"
+
+
+def _bulk(value: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class RespServer:
+    def __init__(self):
+        # key -> (string or list value, expires_at (time.monotonic()) or None)
+        self.data: Dict[bytes, Tuple[Union[bytes, List[bytes]], Optional[float]]] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes) -> Optional[Union[bytes, List[bytes]]]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry[0]
+
+    def execute(self, args: List[bytes], proto: int = 2) -> bytes:
+        self.commands += 1
+        null = b"_\r\n" if proto == 3 else b"$-1\r\n"
+        command = args[0].upper()
+        if command == b"PING":
+            return b"+PONG\r\n"
+        if command == b"GET":
+            value = self._get(args[1])
+            if isinstance(value, list):
+                return _WRONGTYPE
+            return null if value is None else _bulk(value)
+        if command == b"SET":
+            key, value = args[1], args[2]
+            expires_at = None
+            nx = False
+            i = 3
+            while i < len(args):
+                option = args[i].upper()
+                if option == b"PX":
+                    expires_at = time.monotonic() + int(args[i + 1]) / 1000
+                    i += 1
+                elif option == b"EX":
+                    expires_at = time.monotonic() + int(args[i + 1])
+                    i += 1
+                elif option == b"NX":
+                    nx = True
+                i += 1
+            if nx and self._get(key) is not None:
+                return null
+            self.data[key] = (value, expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(1 for key in args[1:] if self._get(key) is not None and self.data.pop(key, None))
+            return b":%d\r\n" % removed
+        if command == b"RPUSH":
+            value = self._get(args[1])
+            if value is None:
+                value = []
+                self.data[args[1]] = (value, None)
+            elif not isinstance(value, list):
+                return _WRONGTYPE
+            value.extend(args[2:])
+            return b":%d\r\n" % len(value)
+        if command == b"LRANGE":
+            value = self._get(args[1]) or []
+            if not isinstance(value, list):
+                return _WRONGTYPE
+            start, stop = int(args[2]), int(args[3])
+            # Redis ranges are inclusive and accept negative indexes
+            items = value[start:] if stop == -1 else value[start:stop + 1]
+            return b"*%d\r\n" % len(items) + b"".join(_bulk(item) for item in items)
+        if command == b"PEXPIRE":
+            value = self._get(args[1])
+            if value is None:
+                return b":0\r\n"
+            self.data[args[1]] = (value, time.monotonic() + int(args[2]) / 1000)
+            return b":1\r\n"
+        if command == b"EXISTS":
+            return b":%d\r\n" % sum(1 for key in args[1:] if self._get(key) is not None)
+        if command == b"FLUSHALL":
+            self.data.clear()
+            return b"+OK\r\n"
+        if command == b"HELLO":
+            proto = int(args[1]) if len(args) > 1 else 2
+            fields = [(b"server", b"resp-stand-in"), (b"version", b"7.0.0"), (b"proto", proto), (b"mode", b"standalone")]
+            out = [b"%%%d\r\n" % len(fields) if proto == 3 else b"*%d\r\n" % (len(fields) * 2)]
+            for name, value in fields:
+                out.append(_bulk(name))
+                out.append(b":%d\r\n" % value if isinstance(value, int) else _bulk(value))
+            return b"".join(out)
+        if command in (b"CLIENT", b"SELECT", b"WATCH", b"UNWATCH"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % command
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        proto = 2
+        # Commands queued between MULTI and EXEC; the server is single-threaded, so EXEC is atomic
+        transaction: Optional[List[List[bytes]]] = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.startswith(b"*"):
+                    args: List[bytes] = []
+                    for _ in range(int(line[1:])):
+                        size = int((await reader.readline())[1:])
+                        args.append((await reader.readexactly(size + 2))[:-2])
+                else:
+                    # Inline command (telnet / nc)
+                    args = line.split()
+                    if not args:
+                        continue
+                if args[0].upper() == b"QUIT":
+                    writer.write(b"+OK\r\n")
+                    break
+                command = args[0].upper()
+                if command == b"HELLO" and len(args) > 1:
+                    proto = int(args[1])
+                if command == b"MULTI":
+                    transaction = []
+                    writer.write(b"+OK\r\n")
+                elif command == b"DISCARD":
+                    transaction = None
+                    writer.write(b"+OK\r\n")
+                elif command == b"EXEC":
+                    if transaction is None:
+                        writer.write(b"-ERR EXEC without MULTI\r\n")
+                    else:
+                        replies = [self.execute(queued, proto) for queued in transaction]
+                        transaction = None
+                        writer.write(b"*%d\r\n" % len(replies) + b"".join(replies))
+                elif transaction is not None:
+                    transaction.append(args)
+                    writer.write(b"+QUEUED\r\n")
+                else:
+                    writer.write(self.execute(args, proto))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def _main(host: str, port: int) -> None:
+    server = await RespServer().start(host, port)
+    print(f"RESP stand-in listening on redis://{host}:{port}/0")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Minimal Redis-protocol server for local tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import secrets
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from state import STATE_BACKEND_URL, get_store
+
+logger = logging.getLogger(__name__)
+
+# Quiet time that ends a burst of messages from one user (0 = no debounce, turns are still serialized).
+# Only applies while the user already has a turn running or queued; a lone message starts at once.
+BURST_DEBOUNCE_SECONDS = float(os.environ.get("BURST_DEBOUNCE_SECONDS", "0.6"))
+# Upper bound on how long the first message of a burst waits for more
+BURST_MAX_WAIT_SECONDS = float(os.environ.get("BURST_MAX_WAIT_SECONDS", "2"))
+# With STATE_BACKEND_URL, a user's turns are also serialized across worker processes through a
+# lock in the shared store. It expires after TURN_LOCK_TTL if its holder dies mid-turn, so keep
+# it above the longest turn (WEBHOOK_DEADLINE_SECONDS, ASYNC_DEADLINE_SECONDS).
+TURN_LOCK_TTL = float(os.environ.get("TURN_LOCK_TTL", "45"))
+# How long a turn waits for another worker's turn before running anyway
+TURN_LOCK_WAIT_SECONDS = float(os.environ.get("TURN_LOCK_WAIT_SECONDS", "12"))
+TURN_LOCK_POLL_INTERVAL = float(os.environ.get("TURN_LOCK_POLL_INTERVAL", "0.05"))
+
+
+class _UserTurns:
+    __slots__ = ("lock", "refs", "burst")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # FIFO: turns run in arrival order
+        self.refs = 0
+        self.burst: Optional[List[str]] = None  # messages not yet picked up by a turn
+
+
+_users: Dict[str, _UserTurns] = {}
+_stats: Dict[str, int] = {
+    "turns": 0,
+    "messages": 0,
+    "merged": 0,
+    "debounced": 0,
+    "max_burst": 0,
+    "lock_waits": 0,
+    "lock_timeouts": 0,
+}
+
+
+def _lock_key(user_number: str) -> str:
+    return f"turn_lock:{user_number}"
+
+
+async def _acquire_shared(key: str, token: str) -> bool:
+    store = get_store()
+    if await store.add(key, token, TURN_LOCK_TTL):
+        return True
+    # Another worker process is running a turn for this user: poll until it releases the lock
+    _stats["lock_waits"] += 1
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + TURN_LOCK_WAIT_SECONDS
+    while loop.time() < give_up:
+        await asyncio.sleep(TURN_LOCK_POLL_INTERVAL)
+        if await store.add(key, token, TURN_LOCK_TTL):
+            return True
+    _stats["lock_timeouts"] += 1
+    return False
+
+
+@asynccontextmanager
+async def shared_turn_lock(user_number: str) -> AsyncIterator[None]:
+    """Hold the user's turn lock in the shared store (no-op without STATE_BACKEND_URL).
+
+    Turns of one user never overlap across workers, but the lock is not a queue: two
+    workers waiting on it may run in either order. If the lock cannot be had within
+    TURN_LOCK_WAIT_SECONDS, or the store is down, the turn runs without it.
+    """
+    if not STATE_BACKEND_URL:
+        yield
+        return
+    key, token = _lock_key(user_number), secrets.token_hex(8)
+    try:
+        held = await _acquire_shared(key, token)
+    except Exception as e:
+        logger.warning("⚠️ Turn lock unavailable, running the turn without it: %s", e)
+        held = False
+    try:
+        yield
+    finally:
+        if held:
+            try:
+                await get_store().delete_if(key, token)
+            except Exception as e:
+                logger.warning("⚠️ Could not release the turn lock of %s: %s", user_number, e)
+
+
+async def run_turn(
+    user_number: str,
+    body: str,
+    handler: Callable[[List[str]], Awaitable[str]],
+) -> Optional[str]:
+    """Run handler(messages) as this user's next turn, one turn per user at a time.
+
+    Messages that arrive while the user's previous turn is still running, or during the
+    debounce window that follows it, are merged into one turn. The message that opened the
+    burst gets the reply; the merged ones get None. Merging is per worker process; across
+    workers, turns are only kept from overlapping (shared_turn_lock).
+    """
+    _stats["messages"] += 1
+    turns = _users.get(user_number)
+    if turns is None:
+        turns = _users[user_number] = _UserTurns()
+    if turns.burst is not None:
+        turns.burst.append(body)
+        _stats["merged"] += 1
+        return None
+
+    burst = turns.burst = [body]
+    # An earlier turn still running or waiting: this message starts a burst worth waiting for
+    busy = turns.refs > 0
+    turns.refs += 1
+    try:
+        if busy and BURST_DEBOUNCE_SECONDS > 0:
+            _stats["debounced"] += 1
+            loop = asyncio.get_running_loop()
+            give_up = loop.time() + BURST_MAX_WAIT_SECONDS
+            seen = 0
+            while len(burst) != seen and loop.time() < give_up:
+                seen = len(burst)
+                await asyncio.sleep(min(BURST_DEBOUNCE_SECONDS, max(0.0, give_up - loop.time())))
+        async with turns.lock, shared_turn_lock(user_number):
+            # Close the burst only now, so messages sent during the previous turn join this one
+            turns.burst = None
+            _stats["turns"] += 1
+            _stats["max_burst"] = max(_stats["max_burst"], len(burst))
+            return await handler(burst)
+    finally:
+        if turns.burst is burst:
+            turns.burst = None
+        turns.refs -= 1
+        if turns.refs == 0 and turns.burst is None:
+            _users.pop(user_number, None)
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["active_users"] = len(_users)
+    stats["shared_lock"] = bool(STATE_BACKEND_URL)
+    return stats
@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Index, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import date, datetime
+from typing import AsyncIterator, List, Tuple
 import os
 
 # Use environment variable first (for Railway/production), then try .env file (for local)
@@ -13,8 +16,67 @@ if not DATABASE_URL:
     except Exception:
         raise ValueError("NEON_DB_URL not found in environment variables or .env file")
 
-# Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL, echo=True)
+# Log every SQL statement (DB_ECHO=1, e.g. local debugging); off by default so production
+# does not format a log line per query on the hot path
+DB_ECHO = os.environ.get("DB_ECHO", "0") == "1"
+
+# Sync SQLAlchemy engine (init_db, migrations, retention scripts); created on first use so
+# the web process never imports the sync driver
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL, echo=DB_ECHO)
+    return _engine
+
+# Async pool settings, tuned for serverless Postgres (Neon suspends idle computes and
+# drops their connections, so keep the pool small, ping before use and recycle often)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "300"))
+
+
+def _async_url_and_args(url: str):
+    """Map a sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)."""
+    sa_url = make_url(url)
+    connect_args = {}
+    if sa_url.get_backend_name() == "postgresql":
+        query = dict(sa_url.query)
+        # asyncpg does not understand libpq-only params such as sslmode/channel_binding
+        sslmode = query.pop("sslmode", None)
+        query.pop("channel_binding", None)
+        if sslmode:
+            connect_args["ssl"] = sslmode
+        # Neon's pooled endpoint runs PgBouncer in transaction mode: no server-side statement cache
+        if sa_url.host and "-pooler" in sa_url.host:
+            connect_args["statement_cache_size"] = 0
+        sa_url = sa_url.set(drivername="postgresql+asyncpg", query=query)
+    elif sa_url.get_backend_name() == "sqlite":
+        sa_url = sa_url.set(drivername="sqlite+aiosqlite")
+    return sa_url, connect_args
+
+
+_async_url, _async_connect_args = _async_url_and_args(DATABASE_URL)
+_async_pool_args = {}
+if _async_url.get_backend_name() != "sqlite":
+    _async_pool_args = dict(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+
+# Async engine used by the webhook so DB round-trips never block the event loop
+async_engine = create_async_engine(
+    _async_url,
+    echo=DB_ECHO,
+    pool_pre_ping=True,
+    connect_args=_async_connect_args,
+    **_async_pool_args,
+)
 
 # Base class for models
 Base = declarative_base()
@@ -29,9 +91,172 @@ class Conversation(Base):
     bot_reply = Column(Text)                     # Chatbot’s reply
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+# Recent-history lookup: WHERE user_number = ? ORDER BY timestamp DESC LIMIT n
+Index(
+    "ix_conversations_user_number_timestamp",
+    Conversation.user_number,
+    Conversation.timestamp.desc(),
+)
+
 # Session maker
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def __getattr__(name: str):
+    # `from db import engine` / `SessionLocal` still work; the sync engine is built on first access
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        globals()["SessionLocal"] = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+        return globals()["SessionLocal"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# FastAPI dependency: one async session per request, always closed (also on errors)
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+
+# Monthly range partitioning of conversations (Postgres only)
+CONVERSATIONS_PARTITIONED = os.environ.get("CONVERSATIONS_PARTITIONED", "1") == "1"
+PARTITION_MONTHS_AHEAD = int(os.environ.get("PARTITION_MONTHS_AHEAD", "2"))
+
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id SERIAL,
+    user_number VARCHAR,
+    user_message TEXT,
+    bot_reply TEXT,
+    "timestamp" TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp")
+"""
+
+_RELKIND_SQL = (
+    "SELECT relkind FROM pg_class "
+    "WHERE relname = 'conversations' AND relkind IN ('r', 'p') AND pg_table_is_visible(oid)"
+)
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"conversations_{month:%Y_%m}"
+
+
+# Catch-all for rows outside every monthly partition; it should stay empty. A month with rows
+# here cannot get its own partition until they are moved (retention.py does that).
+DEFAULT_PARTITION = "conversations_default"
+
+_DEFAULT_PARTITION_MONTHS_SQL = (
+    "SELECT date_trunc('month', \"timestamp\")::date AS month, COUNT(*) "
+    f"FROM {DEFAULT_PARTITION} GROUP BY 1 ORDER BY 1"
+)
+
+
+def default_partition_months(conn) -> List[Tuple[date, int]]:
+    """(month, rows) for every month that has rows in the default partition."""
+    return [(month, count) for month, count in conn.execute(text(_DEFAULT_PARTITION_MONTHS_SQL))]
+
+
+def partition_sql(today: date) -> List[str]:
+    """DDL for the current month, PARTITION_MONTHS_AHEAD months ahead and a default catch-all."""
+    statements = [f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF conversations DEFAULT"]
+    month = month_start(today)
+    for _ in range(PARTITION_MONTHS_AHEAD + 1):
+        next_month = add_months(month, 1)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF conversations "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+    return statements
+
+
+# Schema changes for databases created before the model gained them (idempotent)
+MIGRATIONS = [
+    # Postgres builds it without blocking writes (not possible on a partitioned parent);
+    # the plain form is used there and for SQLite
+    (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_conversations_user_number_timestamp "
+        "ON conversations (user_number, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_conversations_user_number_timestamp "
+        "ON conversations (user_number, timestamp DESC)",
+    ),
+]
+
+
+def _migration_sql(dialect_name: str, partitioned: bool = False) -> List[str]:
+    concurrent = dialect_name == "postgresql" and not partitioned
+    return [pg if concurrent else other for pg, other in MIGRATIONS]
+
+
+def conversations_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(_RELKIND_SQL)).scalar() == "p"
+
+
+def migrate():
+    engine = get_engine()
+    # CONCURRENTLY cannot run inside a transaction, hence autocommit
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        partitioned = conversations_partitioned(conn)
+        for sql in _migration_sql(engine.dialect.name, partitioned):
+            conn.execute(text(sql))
+
+
+async def migrate_async():
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        partitioned = await conn.run_sync(conversations_partitioned)
+        for sql in _migration_sql(async_engine.dialect.name, partitioned):
+            await conn.execute(text(sql))
+
+
+async def default_partition_months_async() -> List[Tuple[date, int]]:
+    """default_partition_months() for the app; [] when conversations is not partitioned."""
+    async with async_engine.connect() as conn:
+        if not await conn.run_sync(conversations_partitioned):
+            return []
+        return await conn.run_sync(default_partition_months)
+
+
+async def ensure_partitions_async() -> int:
+    """Create upcoming monthly partitions; returns how many statements ran (0 if not partitioned)."""
+    async with async_engine.begin() as conn:
+        if not await conn.run_sync(conversations_partitioned):
+            return 0
+        statements = partition_sql(datetime.utcnow().date())
+        for sql in statements:
+            await conn.execute(text(sql))
+        return len(statements)
+
 
 # Initialize DB
 def init_db():
+    engine = get_engine()
+    if CONVERSATIONS_PARTITIONED and engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            exists = conn.execute(text(_RELKIND_SQL)).scalar()
+            if exists is None:
+                conn.execute(text(PARTITIONED_TABLE_SQL))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_conversations_user_number ON conversations (user_number)"))
+            if exists in (None, "p"):
+                for sql in partition_sql(datetime.utcnow().date()):
+                    conn.execute(text(sql))
+    # Creates anything still missing (everything, on SQLite or with partitioning off)
     Base.metadata.create_all(bind=engine)
+    migrate()
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from state import get_store
+
+logger = logging.getLogger(__name__)
+
+# Twilio retries a webhook it gave up on; replies are remembered per MessageSid for this long
+MESSAGE_DEDUP_TTL = float(os.environ.get("MESSAGE_DEDUP_TTL", "3600"))
+# Claim on a MessageSid while its first delivery is being processed (expires if that worker dies)
+MESSAGE_DEDUP_PENDING_TTL = float(os.environ.get("MESSAGE_DEDUP_PENDING_TTL", "60"))
+# How long a duplicate waits for the first delivery's reply; stay under Twilio's 15s timeout
+MESSAGE_DEDUP_WAIT_SECONDS = float(os.environ.get("MESSAGE_DEDUP_WAIT_SECONDS", "12"))
+MESSAGE_DEDUP_POLL_INTERVAL = float(os.environ.get("MESSAGE_DEDUP_POLL_INTERVAL", "0.2"))
+
+# First deliveries being processed in this process; duplicates await the same result
+_inflight: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+_stats: Dict[str, int] = {"first": 0, "duplicates": 0, "replayed": 0, "waited": 0, "wait_timeouts": 0}
+
+
+def _key(message_sid: str) -> str:
+    return f"message:{message_sid}"
+
+
+async def _wait_in_store(message_sid: str) -> Optional[str]:
+    # The first delivery is running in another worker process: poll the shared store
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + MESSAGE_DEDUP_WAIT_SECONDS
+    while loop.time() < give_up:
+        entry = await get_store().get(_key(message_sid))
+        if entry is None:
+            return None
+        if "reply" in entry:
+            return entry["reply"]
+        await asyncio.sleep(MESSAGE_DEDUP_POLL_INTERVAL)
+    _stats["wait_timeouts"] += 1
+    return None
+
+
+async def begin(message_sid: str) -> Tuple[bool, Optional[str]]:
+    """Claim a MessageSid. (True, None) for a first delivery, which must end with finish() or
+    abandon(); (False, reply) for a duplicate, reply None if the first one is still unanswered."""
+    future = _inflight.get(message_sid)
+    if future is not None:
+        _stats["duplicates"] += 1
+        _stats["waited"] += 1
+        try:
+            return False, await asyncio.wait_for(asyncio.shield(future), MESSAGE_DEDUP_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            _stats["wait_timeouts"] += 1
+            return False, None
+
+    store = get_store()
+    if await store.add(_key(message_sid), {"pending": True}, MESSAGE_DEDUP_PENDING_TTL):
+        _inflight[message_sid] = asyncio.get_running_loop().create_future()
+        _stats["first"] += 1
+        return True, None
+
+    _stats["duplicates"] += 1
+    entry = await store.get(_key(message_sid)) or {}
+    if "reply" in entry:
+        _stats["replayed"] += 1
+        return False, entry["reply"]
+    _stats["waited"] += 1
+    return False, await _wait_in_store(message_sid)
+
+
+async def finish(message_sid: str, reply: str) -> None:
+    """Remember the reply for a first delivery and wake duplicates waiting on it."""
+    try:
+        await get_store().set(_key(message_sid), {"reply": reply}, MESSAGE_DEDUP_TTL)
+    except Exception as e:
+        logger.warning("⚠️ Could not store reply for %s: %s", message_sid, e)
+    future = _inflight.pop(message_sid, None)
+    if future is not None and not future.done():
+        future.set_result(reply)
+
+
+async def abandon(message_sid: str) -> None:
+    """Release the claim after a failure so a Twilio retry is processed again."""
+    try:
+        await get_store().delete(_key(message_sid))
+    except Exception as e:
+        logger.warning("⚠️ Could not release %s: %s", message_sid, e)
+    future = _inflight.pop(message_sid, None)
+    if future is not None and not future.done():
+        future.set_result(None)
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["inflight"] = len(_inflight)
+    return stats
@@ -0,0 +1,54 @@
+import os
+
+# Production serving profile: gunicorn managing uvicorn workers, one event loop per core.
+#   gunicorn main:app -c gunicorn.conf.py
+# Several workers need a shared state backend (STATE_BACKEND_URL=redis://...) so sessions,
+# pagination cursors, MessageSid dedup, turn locks and the Reservio cache are seen by every
+# worker; without it the server runs a single worker.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+
+
+def _cpu_count() -> int:
+    # CPUs this process may run on (respects container CPU sets), not the whole host
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Async workers are CPU-bound only between awaits: one per core with a shared state backend,
+# otherwise one; WEB_CONCURRENCY overrides
+_shared_state = bool(os.environ.get("STATE_BACKEND_URL"))
+workers = int(os.environ.get("WEB_CONCURRENCY", str(_cpu_count() if _shared_state else 1)))
+if workers > 1 and not _shared_state:
+    raise SystemExit(
+        f"WEB_CONCURRENCY={workers} needs STATE_BACKEND_URL: without it sessions, dedup and "
+        "per-user turn order are per worker. Set it, or run a single worker."
+    )
+# Workers read this to split per-process limits (e.g. RESERVIO_RATE_LIMIT) between them
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Graceful restarts (deploys, SIGHUP, max_requests): a stopping worker gets this long to
+# finish in-flight webhooks, drain its reply queue and flush conversation rows
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+# Kill a worker whose event loop has been stuck this long
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+keepalive = int(os.environ.get("KEEPALIVE", "5"))
+# Recycle workers periodically; the jitter keeps them from restarting all at once
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = "-" if os.environ.get("ACCESS_LOG", "0") == "1" else None
+loglevel = os.environ.get("LOG_LEVEL", "info").lower()
+
+
+def when_ready(server):
+    if workers > 1 and os.environ.get("ASYNC_REPLY_MODE", "").lower() == "inprocess":
+        server.log.warning(
+            "ASYNC_REPLY_MODE=inprocess with %s workers: bursts are only merged within a worker "
+            "and turns may run out of order; use ASYNC_REPLY_MODE=process or sticky routing",
+            workers,
+        )
+    server.log.info("Serving with %s uvicorn workers", workers)
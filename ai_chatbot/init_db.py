@@ -1,5 +1,8 @@
-from db import init_db
+from db import init_db, engine, conversations_partitioned
 
 if __name__ == "__main__":
     init_db()
     print("✅ Database tables created successfully!")
+    with engine.connect() as conn:
+        if conversations_partitioned(conn):
+            print("✅ conversations is partitioned by month (archive old months with retention.py)")
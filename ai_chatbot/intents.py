@@ -0,0 +1,124 @@
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+# Structured turns are short; longer messages go to the LLM even if they mention a day/service
+INTENT_MAX_WORDS = int(os.environ.get("INTENT_MAX_WORDS", "6"))
+
+GREETINGS = {"hi", "hello", "hey", "ahoj", "čau", "cau", "dobry den", "dobrý den"}
+DATE_RE = re.compile(r"(20\d{2}-\d{2}-\d{2})")
+
+GREETING = "greeting"
+SERVICE = "service"
+MORE = "more"
+DAY = "day"
+FREE_TEXT = "free_text"
+INTENTS = (GREETING, SERVICE, MORE, DAY, FREE_TEXT)
+
+_intent_stats: Dict[str, int] = {name: 0 for name in INTENTS}
+_llm_calls: Dict[str, int] = {name: 0 for name in INTENTS}
+
+
+class Intent(NamedTuple):
+    name: str
+    service: Optional[Dict[str, Any]] = None  # matched Reservio service, if any
+    day: Optional[date] = None                # requested local (Europe/Prague) day, if any
+    more: bool = False
+
+
+def is_greeting(body_norm: str) -> bool:
+    lower = body_norm.lower()
+    return (lower in GREETINGS) or (len(body_norm.split()) <= 3 and any(g in lower for g in GREETINGS))
+
+
+def is_more(lower_body: str) -> bool:
+    return (" more" in lower_body) or (lower_body.strip() == "more") or ("více" in lower_body)
+
+
+def match_service(body_norm: str, services: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Find the service picked by number (1..N) or by name/substring."""
+    if not body_norm:
+        return None
+    if body_norm.isdigit():
+        idx = int(body_norm)
+        if 1 <= idx <= len(services):
+            return services[idx - 1]
+    if len(body_norm) >= 2:
+        folded_body = body_norm.casefold()
+        for svc in services:
+            name = (svc.get("attributes") or {}).get("name") or ""
+            if name and name.casefold() in folded_body or folded_body in name.casefold():
+                return svc
+    return None
+
+
+def parse_requested_day(lower_body: str, today: date) -> Optional[date]:
+    """Parse today / tomorrow / YYYY-MM-DD (English and Czech) relative to the local day."""
+    if "tomorrow" in lower_body or "zítra" in lower_body:
+        return today + timedelta(days=1)
+    if "today" in lower_body or "dnes" in lower_body:
+        return today
+    m = DATE_RE.search(lower_body)
+    if m:
+        try:
+            year, month, day = map(int, m.group(1).split("-"))
+            return date(year, month, day)
+        except ValueError:
+            return None
+    return None
+
+
+def classify(body: str, services: List[Dict[str, Any]], today: date) -> Intent:
+    body_norm = (body or "").strip()
+    lower_body = body_norm.lower()
+    service = match_service(body_norm, services)
+    day = parse_requested_day(lower_body, today)
+    more = is_more(lower_body)
+
+    if is_greeting(body_norm):
+        name = GREETING
+    elif not body_norm or (len(body_norm.split()) > INTENT_MAX_WORDS and not body_norm.isdigit()):
+        name = FREE_TEXT
+    elif day is not None:
+        name = DAY
+    elif more:
+        name = MORE
+    elif service is not None:
+        name = SERVICE
+    else:
+        name = FREE_TEXT
+    return Intent(name, service, day, more)
+
+
+def record(intent: Intent, used_llm: bool) -> None:
+    _intent_stats[intent.name] += 1
+    if used_llm:
+        _llm_calls[intent.name] += 1
+
+
+def get_intent_stats() -> Dict[str, Any]:
+    total = sum(_intent_stats.values())
+    llm_total = sum(_llm_calls.values())
+    stats: Dict[str, Any] = {
+        "total": total,
+        "counts": dict(_intent_stats),
+        "llm_calls": dict(_llm_calls),
+    }
+    stats["hit_rate"] = {
+        name: (count / total if total else 0.0) for name, count in _intent_stats.items()
+    }
+    stats["llm_bypass_rate"] = (total - llm_total) / total if total else 0.0
+    return stats
+
+
+def direct_reply(intent: Intent, service_name: Optional[str], availability_note: str) -> Optional[str]:
+    """Answer a structured turn from the slot summary; None means ask the LLM instead."""
+    if intent.name not in (SERVICE, MORE, DAY) or not availability_note:
+        return None
+    lines: List[str] = []
+    if intent.name == SERVICE and service_name:
+        lines.append(f"Great, {service_name} it is.")
+    lines.append(availability_note)
+    lines.append("Reply with the time you want, 'more' for more options, or a day (today, tomorrow or YYYY-MM-DD).")
+    return "\n".join(lines)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import httpx
+
+import metrics
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
+# Hard cap for a single completion attempt (seconds)
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "8"))
+# Extra attempts after the first one, only for transient errors
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", "0.25"))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "20"))
+
+_client: Optional["AsyncOpenAI"] = None
+_client_lock = threading.Lock()
+
+
+def preload() -> None:
+    """Import the OpenAI SDK and build the client (slow: SDK import, TLS setup); run in a thread at startup."""
+    try:
+        get_client()
+    except Exception as e:
+        logger.warning("⚠️ OpenAI client warm-up failed: %s", e)
+
+
+@lru_cache(maxsize=1)
+def _retryable_errors() -> Tuple[type, ...]:
+    import openai
+
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        asyncio.TimeoutError,
+    )
+
+
+def api_key() -> str:
+    # Environment variable first (Railway), then .env file (local)
+    key = os.environ.get("OPENAI_API_KEY")
+    if not key:
+        try:
+            from decouple import config
+            key = config("OPENAI_API_KEY")
+        except Exception:
+            raise ValueError("OPENAI_API_KEY not found in environment variables or .env file")
+    return key
+
+
+def get_client() -> "AsyncOpenAI":
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            import openai
+
+            # One pooled HTTP client for every completion; retries are handled below, not by the SDK
+            http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+            )
+            _client = openai.AsyncOpenAI(
+                api_key=api_key(),
+                http_client=http_client,
+                timeout=OPENAI_TIMEOUT,
+                max_retries=0,
+            )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def chat_completion(
+    messages: List[Dict[str, str]],
+    *,
+    budget_seconds: float,
+    temperature: float = 0.3,
+) -> Optional[str]:
+    """Return the completion text, or None if no attempt succeeded within budget_seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_seconds
+    client = get_client()
+
+    for attempt in range(OPENAI_MAX_RETRIES + 1):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        start = time.perf_counter()
+        try:
+            completion = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=min(OPENAI_TIMEOUT, remaining),
+                ),
+                min(OPENAI_TIMEOUT, remaining),
+            )
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="openai")
+            return completion.choices[0].message.content
+        except _retryable_errors() as e:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="openai")
+            metrics.UPSTREAM_ERRORS.inc(upstream="openai", reason=type(e).__name__)
+            logger.warning("OpenAI attempt %s failed: %s", attempt + 1, type(e).__name__)
+        except Exception as e:
+            metrics.UPSTREAM_ERRORS.inc(upstream="openai", reason=type(e).__name__)
+            logger.warning("OpenAI call failed: %s", e)
+            return None
+        if attempt == OPENAI_MAX_RETRIES:
+            break
+        # Exponential backoff with full jitter, never sleeping past the deadline
+        delay = random.uniform(0, OPENAI_RETRY_BASE_DELAY * (2 ** attempt))
+        if loop.time() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+    return None
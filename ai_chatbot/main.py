@@ -1,12 +1,38 @@
-from fastapi import FastAPI, Request, Form
+import startup
+# STARTUP_PROFILE=1 times every import below; must run before them
+startup.install()
+from fastapi import FastAPI, Request, Form, Header, HTTPException, Depends
 from fastapi.responses import PlainTextResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from twilio.twiml.messaging_response import MessagingResponse
-from db import SessionLocal, Conversation
-from datetime import datetime
-from openai import OpenAI
+from db import (
+    Conversation,
+    async_engine,
+    default_partition_months_async,
+    ensure_partitions_async,
+    get_async_session,
+    migrate_async,
+)
+import bursts
+import dedup
+import intents
+import llm
+import metrics
+import pagination
+import persistence
+import prefetch
+import prompts
+import sessions
+import twilio_auth
+import workers
+from state import close_store
+from datetime import datetime, timedelta, timezone as dt_timezone
+import asyncio
+import hmac
 import logging
 import os
-from typing import List, Dict
+from typing import Any, Awaitable, List, Optional
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -14,15 +40,23 @@ except Exception:
 
 from reservio import (
     get_business_info,
-    get_booking_slots,
-    summarize_slots,
+    get_slot_index,
+    slot_lines,
+    format_slot_lines,
     get_services,
     summarize_services,
+    start_client as start_reservio_client,
+    close_client as close_reservio_client,
+    get_pool_stats as get_reservio_pool_stats,
+    get_resilience_stats as get_reservio_resilience_stats,
+    get_cache_stats as get_reservio_cache_stats,
+    invalidate_cache as invalidate_reservio_cache,
 )
 
 # Configure logging
+# LOG_LEVEL=WARNING in production skips the per-message INFO lines
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
@@ -30,47 +64,110 @@ logger = logging.getLogger(__name__)
 # Init FastAPI
 app = FastAPI()
 
-# Initialize OpenAI client - try environment variable first (Railway), then .env file (local)
-openai_key = os.environ.get("OPENAI_API_KEY")
-if not openai_key:
-    try:
-        from decouple import config
-        openai_key = config("OPENAI_API_KEY")
-    except Exception:
-        raise ValueError("OPENAI_API_KEY not found in environment variables or .env file")
-        
-client = OpenAI(api_key=openai_key)
+# Fail fast at startup if the OpenAI key is missing; the SDK itself is imported in the background
+llm.api_key()
+
+# Business timezone, resolved once; fixed GMT+1 offset if tzdata is missing (does not handle DST)
+try:
+    PRAGUE_TZ = ZoneInfo("Europe/Prague") if ZoneInfo is not None else None
+except Exception:
+    PRAGUE_TZ = None
+if PRAGUE_TZ is None:
+    PRAGUE_TZ = dt_timezone(timedelta(hours=1))
+UTC_TZ = dt_timezone.utc
 
 # Reservio env-driven defaults
 RESERVIO_SERVICE_ID = os.environ.get("RESERVIO_SERVICE_ID")  # optional
 RESERVIO_RESOURCE_ID = os.environ.get("RESERVIO_RESOURCE_ID")  # optional
 RESERVIO_BUSINESS_ID = os.environ.get("RESERVIO_BUSINESS_ID")  # optional
 
-BOOKING_SYSTEM_PROMPT = (
-    "You are a WhatsApp assistant for a barbershop. "
-    "Your ONLY job is to help the user schedule a haircut appointment. "
-    "Follow these steps:\n"
-    "1) Greet briefly using the business name.\n"
-    "2) First, present the list of available services with numbers.\n"
-    "3) When the user picks a service (by number or name), offer 3-5 nearest available times (display in AM/PM), respecting business hours 8:00–4:00 (Europe/Prague).\n"
-    "4) If the user wants more options, tell them they can reply 'more' to see additional times.\n"
-    "5) If user wants later, suggest future dates within the next 7 days.\n"
-    "6) Collect full name and phone if missing.\n"
-    "7) Confirm summary (service, date, time, barber/resource if applicable).\n"
-    "8) Do not discuss anything outside booking a haircut.\n"
-    "Keep messages short, clear, and actionable."
-)
+# Total time budget per webhook call; Twilio gives up after 15s
+WEBHOOK_DEADLINE_SECONDS = float(os.environ.get("WEBHOOK_DEADLINE_SECONDS", "12"))
+# Least time a turn gets once it is this user's turn, however long it queued behind earlier ones
+TURN_MIN_BUDGET_SECONDS = float(os.environ.get("TURN_MIN_BUDGET_SECONDS", "2"))
+# Time kept back from the LLM for saving the reply; below LLM_MIN_BUDGET_SECONDS skip the LLM
+LLM_DEADLINE_RESERVE_SECONDS = float(os.environ.get("LLM_DEADLINE_RESERVE_SECONDS", "1"))
+LLM_MIN_BUDGET_SECONDS = float(os.environ.get("LLM_MIN_BUDGET_SECONDS", "1.5"))
+
+# Apply idempotent schema migrations (indexes) at startup
+DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "1") == "1"
+# How often to create upcoming monthly conversation partitions (seconds)
+PARTITION_MAINTENANCE_INTERVAL = float(os.environ.get("PARTITION_MAINTENANCE_INTERVAL", "21600"))
+
+# Shared secret for /admin endpoints and /metrics; without it they are closed
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+# Local development only: ADMIN_OPEN=1 serves them without a token when ADMIN_TOKEN is unset
+ADMIN_OPEN = os.environ.get("ADMIN_OPEN", "0") == "1"
+
+# Long-running background loops, cancelled at shutdown
+background_tasks: List[asyncio.Task] = []
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
+    # HTTP clients (TLS setup, OpenAI SDK import) are built in threads; first use waits if needed
+    background_tasks.append(asyncio.ensure_future(start_reservio_client()))
+    background_tasks.append(asyncio.ensure_future(asyncio.to_thread(llm.preload)))
+    with startup.step("persistence"):
+        await persistence.start()
+    with startup.step("prefetch"):
+        await prefetch.start()
+    if DB_AUTO_MIGRATE:
+        # Idempotent index migration in the background so cold starts are not delayed
+        asyncio.ensure_future(run_migrations())
+    background_tasks.append(asyncio.ensure_future(maintain_partitions()))
+    with startup.step("workers"):
+        await workers.start(answer_message)
     logger.info("=" * 50)
     logger.info("🚀 WhatsApp Bot Server Starting Up!")
     logger.info("=" * 50)
-    logger.info(f"✅ Server is running")
-    logger.info(f"✅ OpenAI client initialized")
-    logger.info(f"✅ Database connection ready")
+    logger.info("✅ Server is running")
+    logger.info("✅ OpenAI client warming up")
+    logger.info("✅ Database connection ready")
+    logger.info("✅ Reservio HTTP pool warming up")
+    if workers.ASYNC_REPLY_MODE:
+        logger.info("✅ Async replies: %s (%s workers)", workers.ASYNC_REPLY_MODE, workers.WORKER_COUNT)
     logger.info("=" * 50)
+    if not twilio_auth.signatures_checked():
+        logger.warning("⚠️ /whatsapp accepts unsigned requests (set TWILIO_AUTH_TOKEN; TWILIO_VALIDATE_SIGNATURE=0 is for local dev)")
+    startup.ready()
+
+async def run_migrations():
+    try:
+        await migrate_async()
+        logger.info("✅ Database migrations applied")
+    except Exception as e:
+        logger.warning("⚠️ Database migrations failed: %s", e)
+
+async def maintain_partitions():
+    while True:
+        try:
+            # Rows in the default partition are never pruned by month and block that month's partition
+            stray = await default_partition_months_async()
+            if stray:
+                months = ", ".join(f"{month:%Y-%m} ({count} rows)" for month, count in stray)
+                logger.warning("⚠️ conversations_default holds rows for %s; run retention.py to archive or re-partition them", months)
+            if await ensure_partitions_async():
+                logger.info("✅ Conversation partitions up to date")
+        except Exception as e:
+            logger.warning("⚠️ Partition maintenance failed: %s", e)
+        await asyncio.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
+    # Finish queued replies while the HTTP clients and write-behind queue are still up
+    await workers.stop()
+    await prefetch.stop()
+    await close_reservio_client()
+    await llm.close_client()
+    await close_store()
+    # Flush buffered conversation rows before the database pool goes away
+    await persistence.stop()
+    await async_engine.dispose()
+    logger.info("👋 Reservio, OpenAI, state and database connections closed")
 
 # Health check endpoint (for Railway)
 @app.get("/")
@@ -78,123 +175,391 @@ async def health_check():
     logger.info("🏥 Health check endpoint hit")
     return {"status": "ok", "message": "WhatsApp Bot is running on Railway"}
 
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        if ADMIN_OPEN:
+            return
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# Reservio connection pool counters (for sizing RESERVIO_MAX_CONNECTIONS)
+@app.get("/admin/reservio/pool")
+async def reservio_pool_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return get_reservio_pool_stats()
+
+# Reservio circuit breakers, rate limiter and hedged requests
+@app.get("/admin/reservio/resilience")
+async def reservio_resilience_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return get_reservio_resilience_stats()
+
+# Prefetched availability snapshot: age, refreshes and lookups served from memory
+@app.get("/admin/prefetch")
+async def prefetch_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return prefetch.get_stats()
+
+# Import time per module and startup step durations (STARTUP_PROFILE=1 for the import breakdown)
+@app.get("/admin/startup")
+async def startup_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return startup.get_stats()
+
+# Business info / services cache counters
+@app.get("/admin/cache")
+async def reservio_cache_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return get_reservio_cache_stats()
+
+# Write-behind queue depth, flush sizes and lag
+@app.get("/admin/persistence")
+async def persistence_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return persistence.get_stats()
+
+# Session state hit rate (history served without a DB read)
+@app.get("/admin/sessions")
+async def session_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return sessions.get_stats()
+
+# Async reply queue depth, retries and worst queueing delay
+@app.get("/admin/workers")
+async def worker_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return workers.get_stats()
+
+# Per-user turn serialization and merged bursts
+@app.get("/admin/bursts")
+async def burst_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return bursts.get_stats()
+
+# Webhook signature checks: validated, rejected and unchecked requests
+@app.get("/admin/twilio")
+async def twilio_auth_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return twilio_auth.get_stats()
+
+# MessageSid dedup: first deliveries vs. replayed/waited duplicates
+@app.get("/admin/dedup")
+async def dedup_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return dedup.get_stats()
+
+# Per-intent hit rates and how often the LLM was bypassed
+@app.get("/admin/intents")
+async def intent_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return intents.get_intent_stats()
+
+# Prompt size per LLM turn, trimming and static prefix cache
+@app.get("/admin/prompts")
+async def prompt_stats(x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    return prompts.get_stats()
+
+def require_metrics_auth(x_admin_token: Optional[str], authorization: Optional[str]):
+    # Prometheus can send the token as "Authorization: Bearer <ADMIN_TOKEN>"
+    if authorization and authorization.startswith("Bearer "):
+        x_admin_token = x_admin_token or authorization[len("Bearer "):]
+    require_admin(x_admin_token)
+
+# Prometheus scrape endpoint: per-stage latency histograms, upstream errors, cache and LLM counters
+@app.get("/metrics")
+async def prometheus_metrics(x_admin_token: str = Header(None), authorization: str = Header(None)):
+    require_metrics_auth(x_admin_token, authorization)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def collect_app_metrics():
+    cache = get_reservio_cache_stats()
+    session = sessions.get_stats()
+    snapshot = prefetch.get_stats()
+    yield ("wabot_cache_lookups_total", "counter", "Cache lookups by cache and result", [
+        ({"cache": "reservio", "result": "hit"}, cache["hits"]),
+        ({"cache": "reservio", "result": "stale"}, cache["stale_hits"]),
+        ({"cache": "reservio", "result": "miss"}, cache["misses"]),
+        ({"cache": "slots", "result": "hit"}, cache["slot_day_hits"]),
+        ({"cache": "slots", "result": "miss"}, cache["slot_day_misses"]),
+        ({"cache": "prefetch", "result": "hit"}, snapshot["hits"]),
+        ({"cache": "prefetch", "result": "miss"}, snapshot["misses"]),
+        ({"cache": "session", "result": "hit"}, session["hits"]),
+        ({"cache": "session", "result": "miss"}, session["misses"]),
+    ])
+    intent = intents.get_intent_stats()
+    yield ("wabot_turns_total", "counter", "Turns by intent", [
+        ({"intent": name}, count) for name, count in intent["counts"].items()
+    ])
+    yield ("wabot_llm_calls_total", "counter", "Turns sent to the LLM by intent", [
+        ({"intent": name}, count) for name, count in intent["llm_calls"].items()
+    ])
+    yield ("wabot_llm_bypass_total", "counter", "Turns answered without the LLM", [
+        ({}, intent["total"] - sum(intent["llm_calls"].values())),
+    ])
+    pool = get_reservio_pool_stats()
+    yield ("wabot_reservio_requests_total", "counter", "Reservio HTTP requests", [({}, pool["requests"])])
+    yield ("wabot_reservio_in_flight", "gauge", "Reservio requests in flight", [({}, pool["in_flight"])])
+    resilience = get_reservio_resilience_stats()
+    yield ("wabot_reservio_circuit_open", "gauge", "1 while the endpoint's circuit breaker fails fast", [
+        ({"endpoint": endpoint}, int(circuit["state"] != "closed")) for endpoint, circuit in resilience["circuits"].items()
+    ])
+    yield ("wabot_reservio_hedged_requests_total", "counter", "Second GETs sent after the p95 delay", [
+        ({}, resilience["hedging"]["hedged"]),
+    ])
+    persisted = persistence.get_stats()
+    yield ("wabot_conversation_queue_depth", "gauge", "Conversation rows waiting to be written", [
+        ({}, persisted["queued"] + persisted["retrying"]),
+    ])
+    yield ("wabot_conversation_rows_total", "counter", "Conversation rows by outcome", [
+        ({"outcome": "flushed"}, persisted["flushed"]),
+        ({"outcome": "spilled"}, persisted["spilled"]),
+        ({"outcome": "dropped"}, persisted["dropped"]),
+    ])
+    duplicates = dedup.get_stats()
+    yield ("wabot_duplicate_deliveries_total", "counter", "Twilio retries answered from the dedup store", [
+        ({}, duplicates["duplicates"]),
+    ])
+    webhook_auth = twilio_auth.get_stats()
+    yield ("wabot_rejected_webhooks_total", "counter", "/whatsapp requests refused before processing", [
+        ({"reason": "signature"}, webhook_auth["rejected"]),
+        ({"reason": "recipient"}, webhook_auth["wrong_recipient"]),
+    ])
+    merged = bursts.get_stats()
+    yield ("wabot_merged_messages_total", "counter", "Messages merged into a user's next turn", [({}, merged["merged"])])
+
+metrics.register_collector(collect_app_metrics)
+
+# Drop cached business info, services and availability (e.g. after editing services or a booking)
+@app.post("/admin/cache/invalidate")
+async def reservio_cache_invalidate(business_id: str = None, x_admin_token: str = Header(None)):
+    require_admin(x_admin_token)
+    dropped = await invalidate_reservio_cache(business_id)
+    logger.info("🧹 Reservio cache invalidated (%s entries)", dropped)
+    return {"status": "ok", "invalidated": dropped}
+
+async def load_recent_messages(db: AsyncSession, user_number: str, limit: int = 5) -> List[Conversation]:
+    with metrics.timed("db_read"):
+        result = await db.execute(
+            select(Conversation)
+            .where(Conversation.user_number == user_number)
+            .order_by(Conversation.timestamp.desc())
+            .limit(limit)
+        )
+    rows = list(result.scalars().all())
+    # Include turns still waiting in the write-behind queue so history never lags behind
+    pending = persistence.pending_for(user_number)
+    if pending:
+        rows = sorted(pending + rows, key=lambda c: c.timestamp, reverse=True)[:limit]
+    return rows
+
+async def load_history(db: AsyncSession, user_number: str):
+    """(session, recent turns newest first); the DB is only read when the session is cold."""
+    session = await sessions.get_session(user_number)
+    if session is not None:
+        return session, sessions.history(session)
+    rows = await load_recent_messages(db, user_number, limit=sessions.SESSION_HISTORY_TURNS)
+    return sessions.session_from_history(rows), rows
+
+async def within_budget(aw: Optional[Awaitable[Any]], deadline: float, default: Any, label: str) -> Any:
+    """Await aw until the request deadline; on timeout or error return default.
+
+    Past the deadline, work that finishes without real I/O (a cache hit) is still used.
+    """
+    if aw is None or (asyncio.isfuture(aw) and aw.cancelled()):
+        return default
+    remaining = deadline - asyncio.get_running_loop().time()
+    try:
+        if remaining <= 0:
+            aw = asyncio.ensure_future(aw)
+            if not aw.done():
+                await asyncio.sleep(0)  # one loop pass
+            if not aw.done():
+                raise asyncio.TimeoutError
+            return aw.result()
+        return await asyncio.wait_for(aw, remaining)
+    except asyncio.TimeoutError:
+        logger.warning("⏱️ %s exceeded the webhook deadline, continuing without it", label)
+    except Exception as e:
+        logger.warning("⚠️ %s failed: %s", label, e)
+    if asyncio.isfuture(aw):
+        aw.cancel()
+    elif asyncio.iscoroutine(aw):
+        aw.close()  # never started; avoid "coroutine was never awaited"
+    return default
+
+def fallback_reply(services_summary: str, selected_service_name: Optional[str], availability_note: str) -> str:
+    """Deterministic reply used when the LLM is unavailable or the deadline is too close."""
+    if selected_service_name and availability_note:
+        return (
+            f"{selected_service_name}\n{availability_note}\n"
+            "Reply with the time you want, or 'more' for more options."
+        )
+    return f"{services_summary}\nPlease reply with the number of the service to continue."
+
 # Twilio Webhook Route
 @app.post("/whatsapp")
 async def whatsapp_webhook(
+    request: Request,
     From: str = Form(...),   # WhatsApp user number
-    Body: str = Form(...)    # Incoming message text
+    Body: str = Form(...),   # Incoming message text
+    To: Optional[str] = Form(None),  # Our WhatsApp number
+    MessageSid: Optional[str] = Form(None),  # Same on Twilio retries of this message
+    db: AsyncSession = Depends(get_async_session),
 ):
-    logger.info("=" * 50)
-    logger.info("📱 NEW WHATSAPP MESSAGE RECEIVED")
-    logger.info(f"From: {From}")
-    logger.info(f"Message: {Body}")
-    logger.info("=" * 50)
-    
+    # Only Twilio may trigger a turn (and, in async mode, an outbound REST message)
+    if not twilio_auth.is_from_twilio(request, await request.form()):
+        logger.warning("🚫 Rejected /whatsapp request without a valid X-Twilio-Signature")
+        raise HTTPException(status_code=403, detail="Invalid Twilio signature")
+    if workers.ASYNC_REPLY_MODE and not twilio_auth.is_our_number(To):
+        logger.warning("🚫 Rejected /whatsapp request addressed to a number that is not TWILIO_WHATSAPP_FROM")
+        raise HTTPException(status_code=403, detail="Unknown recipient number")
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("=" * 50)
+        logger.info("📱 NEW WHATSAPP MESSAGE RECEIVED")
+        logger.info("From: %s", From)
+        logger.info("Message: %s", Body)
+        logger.info("=" * 50)
+
+    with metrics.timed("webhook"):
+        return await handle_webhook(From, Body, To, MessageSid, db)
+
+async def handle_webhook(From: str, Body: str, To: Optional[str], MessageSid: Optional[str], db: AsyncSession):
     # Create Twilio response
     twilio_resp = MessagingResponse()
 
-    # Retrieve brief history (last 5 exchanges) for context
-    db = SessionLocal()
-    recent_messages: List[Conversation] = (
-        db.query(Conversation)
-        .filter(Conversation.user_number == From)
-        .order_by(Conversation.timestamp.desc())
-        .limit(5)
-        .all()
-    )
+    # A retried delivery gets the first delivery's reply instead of a second pipeline run
+    if MessageSid:
+        try:
+            first, cached_reply = await dedup.begin(MessageSid)
+        except Exception as e:
+            logger.warning("⚠️ Dedup store unavailable, processing without it: %s", e)
+            first, cached_reply, MessageSid = True, None, None
+        if not first:
+            logger.info("♻️ Duplicate delivery of %s, replaying the first reply", MessageSid)
+            if cached_reply:
+                twilio_resp.message(cached_reply)
+            return PlainTextResponse(str(twilio_resp), media_type="application/xml")
 
-    # Optional: fetch business info (name, timezone) to ground the assistant
-    business_info = await get_business_info(RESERVIO_BUSINESS_ID)
-    business_name = (business_info or {}).get("name") or "our barbershop"
-    timezone = (business_info or {}).get("settings", {}).get("timezone") or "Europe/Prague"
+    received_at = asyncio.get_running_loop().time()
+
+    async def run_turn(messages: List[str]) -> str:
+        # The debounce and the user's previous turn already used part of Twilio's timeout; a turn
+        # that waited that long still gets TURN_MIN_BUDGET_SECONDS from now (it holds the lock)
+        remaining = WEBHOOK_DEADLINE_SECONDS - (asyncio.get_running_loop().time() - received_at)
+        remaining = max(remaining, TURN_MIN_BUDGET_SECONDS)
+        return await answer_message(db, From, "\n".join(messages), deadline_seconds=remaining, intent_text=messages[-1])
+
+    try:
+        if workers.ASYNC_REPLY_MODE:
+            # Acknowledge at once with empty TwiML; a worker replies through the Twilio REST API.
+            # Workers keep each user's turns in order and merge messages queued behind each other.
+            await workers.enqueue(From, To, Body)
+            bot_reply = ""
+            logger.info("📥 Message queued, reply will be sent by a worker")
+        else:
+            # One turn per user at a time; a quick burst of messages becomes a single turn
+            bot_reply = await bursts.run_turn(From, Body, run_turn)
+            if bot_reply is None:
+                bot_reply = ""
+                logger.info("🧩 Message merged into this user's next turn")
+    except BaseException:
+        if MessageSid:
+            await dedup.abandon(MessageSid)
+        raise
+    if MessageSid:
+        await dedup.finish(MessageSid, bot_reply)
+
+    if bot_reply:
+        # Add reply to Twilio response
+        twilio_resp.message(bot_reply)
+        logger.info("📤 Sending response back to WhatsApp")
+    logger.info("=" * 50)
+
+    # Send back Twilio-compatible XML
+    return PlainTextResponse(str(twilio_resp), media_type="application/xml")
+
+async def answer_message(
+    db: AsyncSession,
+    From: str,
+    Body: str,
+    deadline_seconds: float = WEBHOOK_DEADLINE_SECONDS,
+    intent_text: Optional[str] = None,
+) -> str:
+    """Run the booking pipeline for one incoming message and record the turn; returns the reply.
+
+    intent_text is what gets classified when Body is a merged burst (its newest message).
+    """
+    # Overall time budget for this message so Twilio always gets an answer
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + deadline_seconds
 
-    # Fetch services list (Czech names are preserved from API)
-    services = await get_services(RESERVIO_BUSINESS_ID)
+    # Start the independent I/O concurrently: history (last 5 exchanges), business info, services
+    history_task = asyncio.ensure_future(load_history(db, From))
+    # Optional: business info (name, timezone) to ground the assistant
+    business_task = asyncio.ensure_future(get_business_info(RESERVIO_BUSINESS_ID))
+    # Services list (Czech names are preserved from API)
+    services_task = asyncio.ensure_future(get_services(RESERVIO_BUSINESS_ID))
+
+    now_utc = datetime.now(UTC_TZ)
+    now_prague = now_utc.astimezone(PRAGUE_TZ)
+
+    services = await within_budget(services_task, deadline, [], "services")
     services_summary = summarize_services(services)
 
-    # Try to detect selected service by user input (number or name substring)
+    # Classify the turn (greeting, service pick, "more", a day, or free text)
+    intent = intents.classify(Body if intent_text is None else intent_text, services, now_prague.date())
+    if intent.service is None and intent_text is not None and intent_text != Body:
+        # A service picked earlier in the same burst ("1", then "tomorrow")
+        for line in reversed(Body.splitlines()[:-1]):
+            earlier = intents.classify(line, services, now_prague.date())
+            if earlier.name == intents.SERVICE:
+                intent = intent._replace(service=earlier.service)
+                break
+    selected_service = intent.service
+    # "more" continues the user's pagination cursor: next page, no upstream call
+    cursor_page = None
+    if intent.name == intents.MORE:
+        cursor_page = await within_budget(pagination.next_page(From), deadline, None, "pagination cursor")
+    session = None
+    recent_messages: Optional[List[Conversation]] = None
+    if selected_service is None and cursor_page is None and intent.name in (intents.MORE, intents.DAY):
+        # "more" / "tomorrow" refer to the service picked earlier in the conversation
+        session, recent_messages = await within_budget(history_task, deadline, (None, []), "history")
+        session_service_id = (session or {}).get("service_id")
+        if session_service_id:
+            selected_service = next((svc for svc in services if svc.get("id") == session_service_id), None)
+        if selected_service is None:
+            for conv in recent_messages:
+                earlier = intents.classify(conv.user_message or "", services, now_prague.date())
+                if earlier.name == intents.SERVICE:
+                    selected_service = earlier.service
+                    break
+
     selected_service_id = None
     selected_service_name = None
     selected_service_duration_min = None
-    body_norm = (Body or "").strip()
-    if body_norm:
-        # number choice (1..N)
-        if body_norm.isdigit():
-            idx = int(body_norm)
-            if 1 <= idx <= len(services):
-                svc = services[idx - 1]
-                selected_service_id = svc.get("id")
-                attrs = (svc.get("attributes") or {})
-                selected_service_name = attrs.get("name")
-                dur = attrs.get("duration")
-                if isinstance(dur, (int, float)):
-                    selected_service_duration_min = int(dur // 60)
-        # name/substring choice
-        if not selected_service_id and len(body_norm) >= 2:
-            lower_body = body_norm.casefold()
-            for svc in services:
-                attrs = (svc.get("attributes") or {})
-                name = attrs.get("name") or ""
-                if name and name.casefold() in lower_body or lower_body in name.casefold():
-                    selected_service_id = svc.get("id")
-                    selected_service_name = name
-                    dur = attrs.get("duration")
-                    if isinstance(dur, (int, float)):
-                        selected_service_duration_min = int(dur // 60)
-                    break
+    if selected_service is not None:
+        selected_service_id = selected_service.get("id")
+        attrs = (selected_service.get("attributes") or {})
+        selected_service_name = attrs.get("name")
+        dur = attrs.get("duration")
+        if isinstance(dur, (int, float)):
+            selected_service_duration_min = int(dur // 60)
 
-    # Parse explicit day requests (today, tomorrow, or YYYY-MM-DD) in Europe/Prague
+    # Explicit day requests (today, tomorrow, or YYYY-MM-DD) in Europe/Prague
     requested_day_start = None
     requested_day_end = None
-    lower_body = body_norm.lower()
-    # Resolve Prague timezone with fallback to fixed offset if tzdata missing
-    if ZoneInfo is not None:
-        try:
-            prague_tz = ZoneInfo("Europe/Prague")
-            utc_tz = ZoneInfo("UTC")
-        except Exception:
-            prague_tz = None
-            utc_tz = None
-    else:
-        prague_tz = None
-        utc_tz = None
-
-    if prague_tz is None:
-        # Fallback: fixed GMT+1 offset (does not handle DST)
-        from datetime import timezone, timedelta
-        prague_tz = timezone(timedelta(hours=1))
-        utc_tz = timezone.utc
+    if intent.day is not None:
+        requested_day_start = datetime.combine(intent.day, datetime.min.time()).replace(tzinfo=PRAGUE_TZ).astimezone(UTC_TZ)
+        requested_day_end = datetime.combine(intent.day, datetime.max.time()).replace(tzinfo=PRAGUE_TZ).astimezone(UTC_TZ)
 
-    now_prague = datetime.utcnow().replace(tzinfo=utc_tz).astimezone(prague_tz)
-    now_utc = now_prague.astimezone(utc_tz)
-    try:
-        from datetime import timedelta, datetime as dt_mod
-        if "tomorrow" in lower_body or "zítra" in lower_body:
-            day = (now_prague + timedelta(days=1)).date()
-            requested_day_start = dt_mod.combine(day, dt_mod.min.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-            requested_day_end = dt_mod.combine(day, dt_mod.max.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-        elif "today" in lower_body or "dnes" in lower_body:
-            day = now_prague.date()
-            requested_day_start = dt_mod.combine(day, dt_mod.min.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-            requested_day_end = dt_mod.combine(day, dt_mod.max.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-        else:
-            # Simple YYYY-MM-DD parse
-            import re
-            m = re.search(r"(20\d{2}-\d{2}-\d{2})", lower_body)
-            if m:
-                ymd = m.group(1)
-                year, month, day = map(int, ymd.split("-"))
-                day_date = dt_mod(year, month, day).date()
-                requested_day_start = dt_mod.combine(day_date, dt_mod.min.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-                requested_day_end = dt_mod.combine(day_date, dt_mod.max.time()).replace(tzinfo=prague_tz).astimezone(utc_tz)
-    except Exception:
-        requested_day_start = None
-        requested_day_end = None
-
-    # Try to fetch availability for the next 7 days or the requested day (use selected service if provided)
-    availability_note = ""
+    # Fetch availability for the next 7 days or the requested day as soon as the service is known
+    slots_task = None
+    snapshot_lines: Optional[List[str]] = None
     try:
-        from datetime import timedelta
         # Define query window and an effective lower bound that never allows past times
         if requested_day_start and requested_day_end:
             query_start = requested_day_start
@@ -206,122 +571,122 @@ async def whatsapp_webhook(
             query_end = now_utc + timedelta(days=7)
             effective_not_before = now_utc
         effective_service_id = selected_service_id or RESERVIO_SERVICE_ID
-        if effective_service_id:
-            slots = await get_booking_slots(
+        if effective_service_id and cursor_page is None:
+            # Prefetched snapshot (SLOT_PREFETCH_MODE) first: a memory lookup, no upstream call
+            snapshot_lines = prefetch.lookup(effective_service_id, query_start, query_end, effective_not_before)
+        if snapshot_lines is None and effective_service_id and cursor_page is None:
+            slots_task = asyncio.ensure_future(get_slot_index(
                 business_id=RESERVIO_BUSINESS_ID,
                 start_utc=query_start,
                 end_utc=query_end,
                 service_id=effective_service_id,
                 resource_id=RESERVIO_RESOURCE_ID,
-            )
-            # If user asked for "more", increase limit
-            more_requested = (" more" in lower_body) or (lower_body.strip() == "more") or ("více" in lower_body)
-            availability_note = summarize_slots(
-                slots,
-                limit=50 if (requested_day_start or more_requested) else 5,
-                timezone="Europe/Prague",
-                min_duration_minutes=selected_service_duration_min,
-                # Ensure no past times are suggested
-                not_before_utc=effective_not_before,
-                open_hour_local=8,
-                close_hour_local=16,
-                annotate_last_start=bool(requested_day_start),
-            )
+            ))
     except Exception as e:
-        logger.warning(f"Availability fetch failed: {e}")
-
-    # Build chat messages with strict system prompt
-    messages: List[Dict[str, str]] = [
-        {"role": "system", "content": BOOKING_SYSTEM_PROMPT},
-        {
-            "role": "system",
-            "content": f"Business: {business_name}. Timezone: {timezone}. Use only haircut-related booking guidance.",
-        },
-        {
-            "role": "system",
-            "content": f"Current UTC datetime: {datetime.utcnow().isoformat()}Z",
-        },
-    ]
-
-    # Include a short recap of last user/bot exchange to keep context tight
-    for conv in reversed(recent_messages):
-        messages.append({"role": "user", "content": conv.user_message or ""})
-        if conv.bot_reply:
-            messages.append({"role": "assistant", "content": conv.bot_reply})
-
-    # Provide service list first to drive proactive selection
-    if services_summary:
-        messages.append({"role": "system", "content": services_summary})
-
-    # If a service was selected, provide that context and show availability
-    if selected_service_id:
-        messages.append({
-            "role": "system",
-            "content": f"Selected service id: {selected_service_id} name: {selected_service_name}",
-        })
-        if availability_note:
-            messages.append({"role": "system", "content": availability_note})
-
-    # Current user message last
-    # Ensure a first-time greeting with business name if no history
-    if not recent_messages:
-        greet = f"Welcome to {business_name}! How can I help you book a haircut today?"
-        messages.append({"role": "assistant", "content": greet})
-
-    messages.append({"role": "user", "content": Body})
-
-    # On first contact or greeting, send a deterministic greeting with services and return
-    greetings = {"hi", "hello", "hey", "ahoj", "čau", "cau", "dobry den", "dobrý den"}
-    is_greeting = (body_norm.lower() in greetings) or (len(body_norm.split()) <= 3 and any(g in body_norm.lower() for g in greetings))
-    if not recent_messages or is_greeting:
+        logger.warning("Availability fetch failed: %s", e)
+
+    # Wait for the remaining fetches together; latency is the slowest call, not the sum
+    history_result, business_info, slots = await asyncio.gather(
+        within_budget(history_task if recent_messages is None else None, deadline, (None, []), "history"),
+        within_budget(business_task, deadline, None, "business info"),
+        within_budget(slots_task, deadline, None, "booking slots"),
+    )
+    if recent_messages is None:
+        session, recent_messages = history_result
+    business_name = (business_info or {}).get("name") or "our barbershop"
+    timezone = (business_info or {}).get("settings", {}).get("timezone") or "Europe/Prague"
+
+    availability_note = ""
+    if cursor_page is not None:
+        page_lines, _ = cursor_page
+        if page_lines:
+            availability_note = format_slot_lines(page_lines)
+        else:
+            availability_note = "No more available times in this window."
+    elif snapshot_lines is not None or slots_task is not None:
+        try:
+            if snapshot_lines is None and slots is None:
+                # The fetch failed, timed out, was rate limited or the circuit is open, and nothing
+                # is cached for this window: don't claim it's fully booked
+                availability_note = "I can't check availability right now, please try again in a few minutes."
+            elif snapshot_lines is None and not slots:
+                availability_note = "No available booking slots were found in the requested window."
+            else:
+                # Every matching time, filtered once; the user sees them page by page
+                all_lines = snapshot_lines if snapshot_lines is not None else slot_lines(
+                    slots,
+                    timezone=prefetch.SLOT_TIMEZONE,
+                    min_duration_minutes=selected_service_duration_min,
+                    # Ensure no past times are suggested
+                    not_before_utc=effective_not_before,
+                    open_hour_local=prefetch.OPEN_HOUR_LOCAL,
+                    close_hour_local=prefetch.CLOSE_HOUR_LOCAL,
+                )
+                page_size = 50 if requested_day_start else pagination.SLOT_PAGE_SIZE
+                page_lines = all_lines[:page_size]
+                if page_lines:
+                    availability_note = format_slot_lines(page_lines, annotate_last_start=bool(requested_day_start))
+                    await within_budget(
+                        pagination.save_cursor(From, effective_service_id, all_lines, len(page_lines)),
+                        deadline, None, "pagination cursor",
+                    )
+                elif snapshot_lines is not None:
+                    availability_note = "No available booking slots were found in the requested window."
+                else:
+                    availability_note = "Slots data available but could not be parsed."
+        except Exception as e:
+            logger.warning("Availability summary failed: %s", e)
+
+    used_llm = False
+    if not recent_messages or intent.name == intents.GREETING:
+        # On first contact or greeting, send a deterministic greeting with services
         first_reply_parts: List[str] = []
         first_reply_parts.append(f"Welcome to {business_name}! How can I help you book a haircut today?")
         if services_summary:
             first_reply_parts.append(services_summary)
         first_reply_parts.append("Please reply with the number of the service to continue.")
-        first_message_text = "\n".join(first_reply_parts)
+        bot_reply = "\n".join(first_reply_parts)
+    else:
+        # Structured turns (service pick, "more", a day) are answered straight from the slot summary
+        bot_reply = intents.direct_reply(intent, selected_service_name, availability_note)
+        if bot_reply:
+            logger.info("⚡ Answered '%s' turn without the LLM", intent.name)
+        else:
+            used_llm = True
+            messages = prompts.build_messages(
+                Body,
+                business_name=business_name,
+                timezone=timezone,
+                recent_messages=recent_messages,
+                services_summary=services_summary,
+                selected_service_id=selected_service_id,
+                selected_service_name=selected_service_name,
+                availability_note=availability_note,
+            )
+            # Call OpenAI for a constrained booking reply, within what is left of the deadline
+            llm_budget = deadline - loop.time() - LLM_DEADLINE_RESERVE_SECONDS
+            if llm_budget >= LLM_MIN_BUDGET_SECONDS:
+                logger.info("🤖 Calling OpenAI API for barber booking...")
+                bot_reply = await llm.chat_completion(messages, budget_seconds=llm_budget, temperature=0.3)
+            if bot_reply:
+                logger.info("✅ OpenAI Response: %s", bot_reply)
+            else:
+                bot_reply = fallback_reply(services_summary, selected_service_name, availability_note)
+                logger.warning("⚠️ OpenAI unavailable or out of time, sent template reply")
+    intents.record(intent, used_llm)
 
-        twilio_resp.message(first_message_text)
+    # Queue the conversation for Neon DB; it is batch-inserted in the background
+    await persistence.enqueue(From, Body, bot_reply)
+    # Keep the per-user session current so the next turn needs no DB read
+    picked_service_id = None
+    if intent.service is not None and intent.name in (intents.SERVICE, intents.DAY, intents.MORE):
+        picked_service_id = intent.service.get("id")
+    try:
+        await sessions.record_turn(From, session, Body, bot_reply, service_id=picked_service_id)
+    except Exception as e:
+        logger.warning("⚠️ Session update failed: %s", e)
+    logger.info("💾 Conversation queued for database")
+    return bot_reply
 
-        new_message = Conversation(
-            user_number=From,
-            user_message=Body,
-            bot_reply=first_message_text,
-            timestamp=datetime.utcnow()
-        )
-        db.add(new_message)
-        db.commit()
-        db.close()
-
-        return PlainTextResponse(str(twilio_resp), media_type="application/xml")
-
-    # Call OpenAI for a constrained booking reply
-    logger.info("🤖 Calling OpenAI API for barber booking...")
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
-        temperature=0.3,
-    )
-    bot_reply = completion.choices[0].message.content
-    logger.info(f"✅ OpenAI Response: {bot_reply}")
-
-    # Add reply to Twilio response
-    twilio_resp.message(bot_reply)
-
-    # Save conversation to Neon DB
-    logger.info("💾 Saving to database...")
-    new_message = Conversation(
-        user_number=From,
-        user_message=Body,
-        bot_reply=bot_reply,
-        timestamp=datetime.utcnow()
-    )
-    db.add(new_message)
-    db.commit()
-    db.close()
-    logger.info("✅ Conversation saved to database")
-    logger.info("📤 Sending response back to WhatsApp")
-    logger.info("=" * 50)
 
-    # Send back Twilio-compatible XML
-    return PlainTextResponse(str(twilio_resp), media_type="application/xml")
+startup.mark("imported")
@@ -0,0 +1,116 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Latency histogram buckets in seconds, Prometheus text exposition without a client library
+METRICS_BUCKETS = tuple(
+    float(b) for b in os.environ.get("METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# (metric name, type, help, [(labels, value), ...]) produced at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    __slots__ = ("name", "help", "_values")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "_series")
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [count per bucket (not cumulative)..., sum, count]
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, seconds: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect_left(self.buckets, seconds)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(key, inf)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "wabot_stage_duration_seconds",
+    "Time per pipeline stage (db_read, reservio_<endpoint>, openai, db_write, webhook, worker_answer)",
+)
+UPSTREAM_ERRORS = Counter("wabot_upstream_errors_total", "Failed calls to Reservio/OpenAI by upstream and reason")
+
+_collectors: List[Callable[[], Iterable[Family]]] = []
+
+
+@contextmanager
+def timed(stage: str, **labels: str) -> Iterator[None]:
+    """Record the duration of the block (also across awaits) in the stage histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, **labels)
+
+
+def register_collector(collect: Callable[[], Iterable[Family]]) -> None:
+    """Add metrics computed at scrape time, e.g. from a module's existing stats counters."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines: List[str] = STAGE_SECONDS.render() + UPSTREAM_ERRORS.render()
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
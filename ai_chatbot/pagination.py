@@ -0,0 +1,54 @@
+import os
+import time
+from typing import List, Optional, Tuple
+
+from state import get_store
+
+# Times shown per "more" page, and how long a user's cursor survives after the list is built
+SLOT_PAGE_SIZE = int(os.environ.get("SLOT_PAGE_SIZE", "5"))
+SLOT_CURSOR_TTL = float(os.environ.get("SLOT_CURSOR_TTL", "900"))
+
+
+def _key(user_number: str) -> str:
+    # Small position record: {"service_id", "offset", "expires_at"}
+    return f"slot_cursor:{user_number}"
+
+
+def _lines_key(user_number: str) -> str:
+    # The filtered slot lines, written once per listing and read a page at a time
+    return f"slot_cursor_lines:{user_number}"
+
+
+async def save_cursor(user_number: str, service_id: Optional[str], lines: List[str], offset: int) -> None:
+    """Remember the full filtered slot list and how much of it the user has already seen."""
+    store = get_store()
+    await store.set_list(_lines_key(user_number), lines, SLOT_CURSOR_TTL)
+    await store.set(
+        _key(user_number),
+        {"service_id": service_id, "offset": offset, "expires_at": time.time() + SLOT_CURSOR_TTL},
+        SLOT_CURSOR_TTL,
+    )
+
+
+async def next_page(user_number: str, page_size: int = SLOT_PAGE_SIZE) -> Optional[Tuple[List[str], Optional[str]]]:
+    """Return (next lines, service id) and advance the cursor; None when the user has no cursor.
+
+    Only the page itself is read; the stored line list is not rewritten.
+    """
+    store = get_store()
+    cursor = await store.get(_key(user_number))
+    if not cursor:
+        return None
+    offset = int(cursor.get("offset") or 0)
+    page = await store.get_range(_lines_key(user_number), offset, offset + page_size)
+    # Keep the expiry of the line list, so the position never outlives the lines it points into
+    ttl = cursor.get("expires_at", 0) - time.time()
+    if page and ttl > 0:
+        cursor["offset"] = offset + len(page)
+        await store.set(_key(user_number), cursor, ttl)
+    return page, cursor.get("service_id")
+
+
+async def clear_cursor(user_number: str) -> None:
+    await get_store().delete(_key(user_number))
+    await get_store().delete(_lines_key(user_number))
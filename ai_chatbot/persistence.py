@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from db import Conversation, async_engine
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Write-behind queue for Conversation rows: the webhook enqueues, a background task batch-inserts
+CONVERSATION_QUEUE_MAX = int(os.environ.get("CONVERSATION_QUEUE_MAX", "1000"))
+CONVERSATION_BATCH_SIZE = int(os.environ.get("CONVERSATION_BATCH_SIZE", "100"))
+CONVERSATION_FLUSH_INTERVAL = float(os.environ.get("CONVERSATION_FLUSH_INTERVAL", "0.5"))
+# How long enqueue() waits for room in a full queue before spilling/dropping the row
+CONVERSATION_ENQUEUE_TIMEOUT = float(os.environ.get("CONVERSATION_ENQUEUE_TIMEOUT", "0.5"))
+# Optional JSONL journal of rows not yet committed; replayed at startup after a crash.
+# Each server process journals to CONVERSATION_SPILL_FILE.<pid>.
+CONVERSATION_SPILL_FILE = os.environ.get("CONVERSATION_SPILL_FILE")
+
+_queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+_flusher: Optional["asyncio.Task[None]"] = None
+_retry: List[Dict[str, Any]] = []  # rows from a failed batch, written before anything newer
+# Journal file I/O runs on one thread, off the event loop, in submission order
+_journal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spill-journal")
+# <pid>[.overflow|.tmp|.replay-N] after the spill file name; bare/.overflow/.tmp are pre-<pid> files
+_SPILL_SUFFIX = re.compile(r"^(?:(\d+)(\.overflow|\.tmp|\.replay-\d+)?|overflow|tmp)$")
+
+_stats: Dict[str, Any] = {
+    "enqueued": 0,
+    "flushed": 0,
+    "flushes": 0,
+    "flush_errors": 0,
+    "spilled": 0,
+    "dropped": 0,
+    "last_flush_size": 0,
+    "max_flush_size": 0,
+    "last_lag_seconds": 0.0,
+    "max_lag_seconds": 0.0,
+}
+
+
+def _row(user_number: str, user_message: str, bot_reply: str) -> Dict[str, Any]:
+    return {
+        "user_number": user_number,
+        "user_message": user_message,
+        "bot_reply": bot_reply,
+        "timestamp": datetime.utcnow().isoformat(),
+        "enqueued_at": time.time(),
+    }
+
+
+def _pending() -> List[Dict[str, Any]]:
+    queued = list(_queue._queue) if _queue is not None else []  # type: ignore[attr-defined]
+    return _retry + queued
+
+
+def _journal_path() -> str:
+    # One journal per process: gunicorn workers never rewrite each other's rows
+    return f"{CONVERSATION_SPILL_FILE}.{os.getpid()}"
+
+
+def _overflow_path() -> str:
+    # Rows that did not fit in the queue; only read back at the next startup
+    return _journal_path() + ".overflow"
+
+
+def pending_for(user_number: str) -> List[Conversation]:
+    """Rows for this user that are queued but not committed yet (newest first)."""
+    rows = [r for r in _pending() if r["user_number"] == user_number]
+    return [
+        Conversation(
+            user_number=r["user_number"],
+            user_message=r["user_message"],
+            bot_reply=r["bot_reply"],
+            timestamp=datetime.fromisoformat(r["timestamp"]),
+        )
+        for r in reversed(rows)
+    ]
+
+
+def _write_append(path: str, row: Dict[str, Any]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def _write_rewrite(path: str, rows: List[Dict[str, Any]]) -> None:
+    # Atomic replace so a crash never leaves half a file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+async def _journal(fn, *args) -> None:
+    # Submitted synchronously, so journal writes happen in the order the loop issued them
+    await asyncio.get_running_loop().run_in_executor(_journal_executor, fn, *args)
+
+
+async def _journal_append(row: Dict[str, Any], path: Optional[str] = None) -> None:
+    if not CONVERSATION_SPILL_FILE:
+        return
+    await _journal(_write_append, path or _journal_path(), row)
+
+
+async def _journal_rewrite() -> None:
+    # Keep only rows that are still pending (snapshot taken on the loop, written on the journal thread)
+    if not CONVERSATION_SPILL_FILE:
+        return
+    await _journal(_write_rewrite, _journal_path(), _pending())
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    except OSError:
+        return False
+    return True
+
+
+def _claim_spill_files() -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Take over the journals of processes that are gone; (their rows, claimed paths to delete).
+
+    A claim is a rename into this process's namespace, so when several workers start at once
+    each file is replayed by exactly one of them.
+    """
+    directory, name = os.path.split(os.path.abspath(CONVERSATION_SPILL_FILE))
+    if not os.path.isdir(directory):
+        return [], []
+    rows: List[Dict[str, Any]] = []
+    claimed: List[str] = []
+    me = os.getpid()
+    for entry in sorted(os.listdir(directory)):
+        if entry == name:
+            suffix = None
+        elif entry.startswith(name + "."):
+            suffix = _SPILL_SUFFIX.match(entry[len(name) + 1:])
+            if suffix is None:
+                continue
+        else:
+            continue
+        owner = int(suffix.group(1)) if suffix is not None and suffix.group(1) else None
+        if owner is not None and owner != me and _pid_alive(owner):
+            continue  # a running worker's journal
+        path = os.path.join(directory, entry)
+        if entry.endswith(".tmp"):
+            # Half-written rewrite of a dead process; its journal still holds the rows
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        # Only this process writes into its own namespace, so a free name stays free
+        n = 0
+        while os.path.exists(f"{_journal_path()}.replay-{n}"):
+            n += 1
+        target = f"{_journal_path()}.replay-{n}"
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            continue  # claimed by another worker first
+        rows.extend(_journal_load(target))
+        claimed.append(target)
+    return rows, claimed
+
+
+def _journal_load(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    rows: List[Dict[str, Any]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                logger.warning("Skipping corrupt line in conversation spill file")
+    return rows
+
+
+async def enqueue(user_number: str, user_message: str, bot_reply: str) -> None:
+    """Queue a Conversation row; waits briefly when the buffer is full (backpressure)."""
+    row = _row(user_number, user_message, bot_reply)
+    if _queue is None:
+        # Writer not running (scripts, tests): write through
+        await _insert([row])
+        return
+    try:
+        _queue.put_nowait(row)
+    except asyncio.QueueFull:
+        try:
+            await asyncio.wait_for(_queue.put(row), CONVERSATION_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if CONVERSATION_SPILL_FILE:
+                # Not lost: the next startup replays it
+                await _journal_append(row, _overflow_path())
+                _stats["spilled"] += 1
+                logger.warning("Conversation queue full, row kept in spill file only")
+            else:
+                _stats["dropped"] += 1
+                logger.error("Conversation queue full, dropping row")
+            return
+    _stats["enqueued"] += 1
+    await _journal_append(row)
+
+
+async def _insert(rows: List[Dict[str, Any]]) -> None:
+    values = [
+        {
+            "user_number": r["user_number"],
+            "user_message": r["user_message"],
+            "bot_reply": r["bot_reply"],
+            "timestamp": datetime.fromisoformat(r["timestamp"]),
+        }
+        for r in rows
+    ]
+    # executemany of one INSERT: SQLAlchemy sends multi-row INSERT ... VALUES batches
+    with metrics.timed("db_write"):
+        async with async_engine.begin() as conn:
+            await conn.execute(insert(Conversation), values)
+
+
+async def _flush(batch: List[Dict[str, Any]]) -> bool:
+    try:
+        await _insert(batch)
+    except Exception as e:
+        _stats["flush_errors"] += 1
+        logger.warning("Conversation flush of %s rows failed: %s", len(batch), e)
+        return False
+    now = time.time()
+    lag = max(0.0, now - min(r.get("enqueued_at", now) for r in batch))
+    _stats["flushes"] += 1
+    _stats["flushed"] += len(batch)
+    _stats["last_flush_size"] = len(batch)
+    _stats["max_flush_size"] = max(_stats["max_flush_size"], len(batch))
+    _stats["last_lag_seconds"] = lag
+    _stats["max_lag_seconds"] = max(_stats["max_lag_seconds"], lag)
+    return True
+
+
+async def _flush_loop() -> None:
+    global _retry
+    assert _queue is not None
+    backoff = CONVERSATION_FLUSH_INTERVAL
+    while True:
+        if not _retry:
+            _retry = [await _queue.get()]
+            # Give the batch a moment to fill up
+            await asyncio.sleep(CONVERSATION_FLUSH_INTERVAL)
+        while len(_retry) < CONVERSATION_BATCH_SIZE and not _queue.empty():
+            _retry.append(_queue.get_nowait())
+        batch = _retry
+        if await _flush(batch):
+            _retry = []
+            backoff = CONVERSATION_FLUSH_INTERVAL
+            await _journal_rewrite()
+        else:
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+async def start() -> None:
+    """Start the background writer (app startup); replays rows spilled by processes that are gone."""
+    global _queue, _flusher, _retry
+    if _queue is not None:
+        return
+    _queue = asyncio.Queue(maxsize=CONVERSATION_QUEUE_MAX)
+    _retry = []
+    if CONVERSATION_SPILL_FILE:
+        loop = asyncio.get_running_loop()
+        _retry, claimed = await loop.run_in_executor(_journal_executor, _claim_spill_files)
+        if _retry:
+            logger.info("Replaying %s conversation rows from spill files", len(_retry))
+        if claimed:
+            # Fold the claimed rows into this process's journal before dropping the claimed files
+            await _journal_rewrite()
+            for path in claimed:
+                await _journal(os.remove, path)
+    _flusher = asyncio.ensure_future(_flush_loop())
+
+
+async def stop() -> None:
+    """Flush everything still buffered, then stop the writer (app shutdown)."""
+    global _queue, _flusher, _retry
+    if _queue is None:
+        return
+    if _flusher is not None:
+        _flusher.cancel()
+        try:
+            await _flusher
+        except asyncio.CancelledError:
+            pass
+    pending = _pending()
+    _queue = None
+    flushed = 0
+    while flushed < len(pending):
+        batch = pending[flushed:flushed + CONVERSATION_BATCH_SIZE]
+        if not await _flush(batch):
+            logger.error("Could not flush %s conversation rows at shutdown", len(pending) - flushed)
+            break
+        flushed += len(batch)
+    # Whatever could not be written stays in the spill file for the next start
+    _retry = pending[flushed:]
+    await _journal_rewrite()
+    if CONVERSATION_SPILL_FILE and not _retry:
+        await _journal(os.remove, _journal_path())
+    _retry = []
+    _flusher = None
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    stats["queued"] = _queue.qsize() if _queue is not None else 0
+    stats["retrying"] = len(_retry)
+    stats["queue_max"] = CONVERSATION_QUEUE_MAX
+    return stats
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+try:
+    from zoneinfo import ZoneInfo
+except Exception:
+    ZoneInfo = None  # type: ignore
+
+import reservio
+from state import STATE_BACKEND_URL, close_store, get_store
+
+logger = logging.getLogger(__name__)
+
+# Availability snapshots. Unset: fetch slots on demand only.
+# "inprocess": each app process refreshes its own snapshot from a background task.
+# "process": `python prefetch.py` refreshes and publishes to the shared state store; app processes pull it.
+SLOT_PREFETCH_MODE = os.environ.get("SLOT_PREFETCH_MODE", "").lower()
+# Seconds between refreshes; keep it >= RESERVIO_SLOT_CACHE_TTL so each refresh reaches Reservio
+SLOT_PREFETCH_INTERVAL = float(os.environ.get("SLOT_PREFETCH_INTERVAL", "60"))
+SLOT_PREFETCH_DAYS = int(os.environ.get("SLOT_PREFETCH_DAYS", "7"))
+# Older snapshots are not served; the webhook fetches on demand instead
+SLOT_PREFETCH_MAX_AGE = float(os.environ.get("SLOT_PREFETCH_MAX_AGE", str(SLOT_PREFETCH_INTERVAL * 3)))
+RESERVIO_RESOURCE_ID = os.environ.get("RESERVIO_RESOURCE_ID")  # optional
+
+# Display filters applied to every availability answer (shared with the webhook)
+SLOT_TIMEZONE = "Europe/Prague"
+OPEN_HOUR_LOCAL = 8
+CLOSE_HOUR_LOCAL = 16
+
+try:
+    _SLOT_TZ = ZoneInfo(SLOT_TIMEZONE) if ZoneInfo is not None else timezone.utc
+except Exception:
+    _SLOT_TZ = timezone.utc  # tzdata missing: days are grouped by UTC date
+
+_STORE_KEY = "prefetch:slots"
+
+# {"built_at": epoch, "from": epoch, "to": epoch,
+#  "services": {service id: {local day: {"starts": [epoch, ...], "lines": ["- 9:00 AM–9:30 AM", ...]}}},
+#  "fetched_at": {service id: epoch its days were fetched from}}; a service kept from an earlier
+#  refresh covers fetched_at + SLOT_PREFETCH_DAYS (+ max age), not the whole from/to window
+_snapshot: Optional[Dict[str, Any]] = None
+_task: Optional["asyncio.Task[None]"] = None
+_stats: Dict[str, Any] = {
+    "refreshes": 0,
+    "refresh_errors": 0,
+    "failed_services": 0,
+    "pulls": 0,
+    "hits": 0,
+    "misses": 0,
+    "last_refresh_seconds": 0.0,
+}
+
+
+def _duration_minutes(service: Dict[str, Any]) -> Optional[int]:
+    duration = (service.get("attributes") or {}).get("duration")
+    return int(duration // 60) if isinstance(duration, (int, float)) else None
+
+
+async def build_snapshot() -> Optional[Dict[str, Any]]:
+    """Fetch the next SLOT_PREFETCH_DAYS of availability for every service and pre-render the lines."""
+    services = await reservio.get_services()
+    if not services:
+        return None
+    now = datetime.now(timezone.utc)
+    # Reach past the horizon by the max age, so a snapshot still covers "next 7 days" until it expires
+    end = now + timedelta(days=SLOT_PREFETCH_DAYS, seconds=SLOT_PREFETCH_MAX_AGE)
+    previous = _snapshot or {}
+    snapshot_services: Dict[str, Dict[str, Dict[str, List[Any]]]] = {}
+    fetched_at: Dict[str, float] = {}
+    # One service at a time keeps the upstream load flat
+    for service in services:
+        service_id = service.get("id")
+        if not service_id:
+            continue
+        index = await reservio.get_slot_index(
+            start_utc=now,
+            end_utc=end,
+            service_id=service_id,
+            resource_id=RESERVIO_RESOURCE_ID,
+        )
+        if index is None:
+            # Fetch failed: keep the last good days (lookup() drops them once they are too old),
+            # or leave the service out so the webhook fetches on demand; never publish "no slots"
+            if service_id in previous.get("services", {}):
+                snapshot_services[service_id] = previous["services"][service_id]
+                fetched_at[service_id] = previous.get("fetched_at", {}).get(service_id, previous["from"])
+            _stats["failed_services"] += 1
+            continue
+        days: Dict[str, Dict[str, List[Any]]] = {}
+        for start_epoch, line in reservio.slot_entries(
+            index,
+            timezone=SLOT_TIMEZONE,
+            min_duration_minutes=_duration_minutes(service),
+            open_hour_local=OPEN_HOUR_LOCAL,
+            close_hour_local=CLOSE_HOUR_LOCAL,
+        ):
+            day = days.setdefault(datetime.fromtimestamp(start_epoch, _SLOT_TZ).date().isoformat(), {"starts": [], "lines": []})
+            day["starts"].append(start_epoch)
+            day["lines"].append(line)
+        snapshot_services[service_id] = days
+        fetched_at[service_id] = now.timestamp()
+    return {
+        "built_at": time.time(),
+        "from": int(now.timestamp()),
+        "to": int(end.timestamp()),
+        "services": snapshot_services,
+        "fetched_at": fetched_at,
+    }
+
+
+async def refresh() -> None:
+    global _snapshot
+    started = time.perf_counter()
+    try:
+        snapshot = await build_snapshot()
+    except Exception as e:
+        snapshot = None
+        logger.warning("⚠️ Availability prefetch failed: %s", e)
+    _stats["last_refresh_seconds"] = time.perf_counter() - started
+    if snapshot is None:
+        _stats["refresh_errors"] += 1
+        return
+    _snapshot = snapshot
+    _stats["refreshes"] += 1
+
+
+async def pull() -> None:
+    """Load the snapshot published by `python prefetch.py` (SLOT_PREFETCH_MODE=process)."""
+    global _snapshot
+    try:
+        snapshot = await get_store().get(_STORE_KEY)
+    except Exception as e:
+        logger.warning("⚠️ Could not read the availability snapshot: %s", e)
+        return
+    _stats["pulls"] += 1
+    if snapshot is not None:
+        _snapshot = snapshot
+
+
+def lookup(
+    service_id: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    not_before_utc: datetime,
+) -> Optional[List[str]]:
+    """Slot lines for the window from the snapshot; None when it is missing, stale or too short."""
+    snapshot = _snapshot
+    lo = int(max(start_utc, not_before_utc).timestamp())
+    hi = int(end_utc.timestamp())
+    fetched_at = None
+    if snapshot is not None:
+        fetched_at = snapshot.get("fetched_at", {}).get(service_id, snapshot["from"])
+    if (
+        snapshot is None
+        or time.time() - snapshot["built_at"] > SLOT_PREFETCH_MAX_AGE
+        or service_id not in snapshot["services"]
+        or time.time() - fetched_at > SLOT_PREFETCH_MAX_AGE
+        or lo < snapshot["from"]
+        or hi > min(snapshot["to"], fetched_at + SLOT_PREFETCH_DAYS * 86400 + SLOT_PREFETCH_MAX_AGE)
+    ):
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    lines: List[str] = []
+    days = snapshot["services"][service_id]
+    for day in sorted(days):
+        starts = days[day]["starts"]
+        lines.extend(days[day]["lines"][bisect_left(starts, lo):bisect_right(starts, hi)])
+    return lines
+
+
+async def _refresh_loop() -> None:
+    while True:
+        await refresh()
+        await asyncio.sleep(SLOT_PREFETCH_INTERVAL)
+
+
+async def _pull_loop() -> None:
+    while True:
+        await pull()
+        await asyncio.sleep(min(SLOT_PREFETCH_INTERVAL, 10))
+
+
+async def start() -> None:
+    """Start the refresh (inprocess) or pull (process) loop; called at app startup."""
+    global _task
+    if _task is not None:
+        return
+    if SLOT_PREFETCH_MODE == "inprocess":
+        _task = asyncio.ensure_future(_refresh_loop())
+    elif SLOT_PREFETCH_MODE == "process":
+        _task = asyncio.ensure_future(_pull_loop())
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["mode"] = SLOT_PREFETCH_MODE or "off"
+    stats["interval_seconds"] = SLOT_PREFETCH_INTERVAL
+    if _snapshot is not None:
+        stats["age_seconds"] = time.time() - _snapshot["built_at"]
+        stats["services"] = len(_snapshot["services"])
+        stats["days"] = sum(len(days) for days in _snapshot["services"].values())
+    return stats
+
+
+async def _serve() -> None:
+    await reservio.start_client()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    logger.info("🗓️ Prefetching availability every %.0fs", SLOT_PREFETCH_INTERVAL)
+    while not stopping.is_set():
+        await refresh()
+        if _snapshot is not None:
+            try:
+                await get_store().set(_STORE_KEY, _snapshot, SLOT_PREFETCH_MAX_AGE)
+            except Exception as e:
+                logger.warning("⚠️ Could not publish the availability snapshot: %s", e)
+        try:
+            await asyncio.wait_for(stopping.wait(), SLOT_PREFETCH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+    await reservio.close_client()
+    await close_store()
+
+
+def run() -> None:
+    logging.basicConfig(
+        level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    if not STATE_BACKEND_URL:
+        logger.warning("⚠️ STATE_BACKEND_URL is not set: the app processes cannot see this process's snapshots")
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    # Run from the importable module, like workers.py
+    import prefetch
+
+    prefetch.run()
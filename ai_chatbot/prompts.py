@@ -0,0 +1,184 @@
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import Conversation
+from llm import OPENAI_MODEL
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # token counts fall back to a characters/4 estimate
+
+# Input tokens per LLM turn; history and slot lists are trimmed to fit, the static prefix never is
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "1500"))
+# Share of what is left after the fixed parts that the slot list may use when there is history
+PROMPT_SLOT_SHARE = float(os.environ.get("PROMPT_SLOT_SHARE", "0.5"))
+
+BOOKING_SYSTEM_PROMPT = (
+    "You are a WhatsApp assistant for a barbershop. "
+    "Your ONLY job is to help the user schedule a haircut appointment. "
+    "Follow these steps:\n"
+    "1) Greet briefly using the business name.\n"
+    "2) First, present the list of available services with numbers.\n"
+    "3) When the user picks a service (by number or name), offer 3-5 nearest available times (display in AM/PM), respecting business hours 8:00–4:00 (Europe/Prague).\n"
+    "4) If the user wants more options, tell them they can reply 'more' to see additional times.\n"
+    "5) If user wants later, suggest future dates within the next 7 days.\n"
+    "6) Collect full name and phone if missing.\n"
+    "7) Confirm summary (service, date, time, barber/resource if applicable).\n"
+    "8) Do not discuss anything outside booking a haircut.\n"
+    "Keep messages short, clear, and actionable."
+)
+
+# Chat format overhead: per message (role, separators) and once per request (reply priming)
+_TOKENS_PER_MESSAGE = 4
+_TOKENS_PER_REQUEST = 3
+
+_stats: Dict[str, int] = {
+    "prompts": 0,
+    "last_tokens": 0,
+    "max_tokens": 0,
+    "over_budget": 0,
+    "trimmed_history_turns": 0,
+    "trimmed_slot_lines": 0,
+}
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(OPENAI_MODEL)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None  # e.g. encoding files not downloadable
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def message_tokens(content: str) -> int:
+    return count_tokens(content) + _TOKENS_PER_MESSAGE
+
+
+@lru_cache(maxsize=64)
+def static_prefix(business_name: str, timezone: str, services_summary: str) -> Tuple[Tuple[Tuple[str, str], ...], int]:
+    """((role, content), ...) that opens every prompt for a business, and its token count.
+
+    Nothing per-turn goes in here, so the prefix is byte-identical across turns and users
+    and the provider's prompt cache can reuse it.
+    """
+    prefix: List[Tuple[str, str]] = [
+        ("system", BOOKING_SYSTEM_PROMPT),
+        ("system", f"Business: {business_name}. Timezone: {timezone}. Use only haircut-related booking guidance."),
+    ]
+    # Provide service list first to drive proactive selection
+    if services_summary:
+        prefix.append(("system", services_summary))
+    return tuple(prefix), sum(message_tokens(content) for _, content in prefix)
+
+
+def trim_slot_note(note: str, budget: int) -> Tuple[str, int]:
+    """Keep the header and as many slot lines as fit in budget tokens; returns (note, lines dropped)."""
+    if message_tokens(note) <= budget:
+        return note, 0
+    header, *lines = note.split("\n")
+    kept: List[str] = []
+    # Room for the "+N more" line appended below
+    used = message_tokens(header) + 16
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    dropped = len(lines) - len(kept)
+    # Let the model know the list goes on, so it offers 'more' instead of saying that's all
+    kept.append(f"(+{dropped} more times not shown; the user can reply 'more')")
+    return "\n".join([header] + kept), dropped
+
+
+def build_messages(
+    body: str,
+    *,
+    business_name: str,
+    timezone: str,
+    recent_messages: List[Conversation],
+    services_summary: str,
+    selected_service_id: Optional[str],
+    selected_service_name: Optional[str],
+    availability_note: str,
+    token_budget: int = PROMPT_TOKEN_BUDGET,
+) -> List[Dict[str, str]]:
+    """Chat messages for one turn: cached static prefix, then history, then per-turn context."""
+    prefix, prefix_tokens = static_prefix(business_name, timezone, services_summary)
+
+    # Per-turn context goes after the prefix and history
+    context: List[Tuple[str, str]] = [("system", f"Current UTC datetime: {datetime.utcnow().isoformat()}Z")]
+    if selected_service_id:
+        context.append(("system", f"Selected service id: {selected_service_id} name: {selected_service_name}"))
+    fixed_tokens = (
+        prefix_tokens
+        + sum(message_tokens(content) for _, content in context)
+        + message_tokens(body)
+        + _TOKENS_PER_REQUEST
+    )
+    remaining = max(0, token_budget - fixed_tokens)
+
+    # Slot list: all of what is left without history, otherwise its share
+    if selected_service_id and availability_note:
+        slot_budget = int(remaining * PROMPT_SLOT_SHARE) if recent_messages else remaining
+        availability_note, dropped = trim_slot_note(availability_note, slot_budget)
+        _stats["trimmed_slot_lines"] += dropped
+        context.append(("system", availability_note))
+        remaining -= message_tokens(availability_note)
+
+    # History: newest turns first, as many whole turns as still fit
+    turns: List[List[Tuple[str, str]]] = []
+    for conv in recent_messages:
+        turn = [("user", conv.user_message or "")]
+        if conv.bot_reply:
+            turn.append(("assistant", conv.bot_reply))
+        cost = sum(message_tokens(content) for _, content in turn)
+        if cost > remaining:
+            break
+        turns.append(turn)
+        remaining -= cost
+    _stats["trimmed_history_turns"] += len(recent_messages) - len(turns)
+
+    messages: List[Dict[str, str]] = [{"role": role, "content": content} for role, content in prefix]
+    for turn in reversed(turns):
+        messages.extend({"role": role, "content": content} for role, content in turn)
+    messages.extend({"role": role, "content": content} for role, content in context)
+    # Current user message last
+    messages.append({"role": "user", "content": body})
+
+    tokens = prompt_tokens(messages)
+    _stats["prompts"] += 1
+    _stats["last_tokens"] = tokens
+    _stats["max_tokens"] = max(_stats["max_tokens"], tokens)
+    if tokens > token_budget:
+        _stats["over_budget"] += 1
+    return messages
+
+
+def prompt_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(message_tokens(m["content"]) for m in messages) + _TOKENS_PER_REQUEST
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["token_budget"] = PROMPT_TOKEN_BUDGET
+    stats["tokenizer"] = "tiktoken" if _encoding() is not None else "estimate"
+    info = static_prefix.cache_info()
+    stats["prefix_cache"] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
@@ -1,6 +1,12 @@
+import asyncio
 import os
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import secrets
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import httpx
 try:
@@ -8,6 +14,10 @@ try:
 except Exception:
     ZoneInfo = None  # type: ignore
 
+import metrics
+import state
+from resilience import CLOSED, CircuitBreaker, CircuitOpenError, LatencyWindow, RateLimitedError, TokenBucket, hedged
+
 
 RESERVIO_BASE_URL = os.environ.get(
     "RESERVIO_BASE_URL",
@@ -21,6 +31,91 @@ DEFAULT_BUSINESS_ID = os.environ.get(
 )
 
 
+# Shared HTTP client settings (one pooled client for the app's lifetime)
+RESERVIO_MAX_CONNECTIONS = int(os.environ.get("RESERVIO_MAX_CONNECTIONS", "20"))
+RESERVIO_MAX_KEEPALIVE = int(os.environ.get("RESERVIO_MAX_KEEPALIVE", "10"))
+RESERVIO_KEEPALIVE_EXPIRY = float(os.environ.get("RESERVIO_KEEPALIVE_EXPIRY", "60"))
+RESERVIO_POOL_TIMEOUT = float(os.environ.get("RESERVIO_POOL_TIMEOUT", "2"))
+RESERVIO_CONNECT_TIMEOUT = float(os.environ.get("RESERVIO_CONNECT_TIMEOUT", "3"))
+
+# Per-endpoint read timeouts (seconds)
+RESERVIO_TIMEOUTS: Dict[str, float] = {
+    "business": float(os.environ.get("RESERVIO_TIMEOUT_BUSINESS", "10")),
+    "services": float(os.environ.get("RESERVIO_TIMEOUT_SERVICES", "10")),
+    "slots": float(os.environ.get("RESERVIO_TIMEOUT_SLOTS", "12")),
+}
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+# Business info / services catalog cache (changes rarely; keyed by business id)
+RESERVIO_CACHE_TTL = float(os.environ.get("RESERVIO_CACHE_TTL", "3600"))
+# How long past the TTL a stale entry may still be served while it refreshes in the background
+RESERVIO_CACHE_STALE_TTL = float(os.environ.get("RESERVIO_CACHE_STALE_TTL", "86400"))
+
+# Availability cache: short-lived, stored per (business, service, resource) and UTC day
+RESERVIO_SLOT_CACHE_TTL = float(os.environ.get("RESERVIO_SLOT_CACHE_TTL", "60"))
+
+# Circuit breaker per endpoint: open after N consecutive failures (errors, timeouts, 5xx, 429),
+# fail fast while open and let one probe through after the reset interval
+RESERVIO_CB_FAILURES = int(os.environ.get("RESERVIO_CB_FAILURES", "5"))
+RESERVIO_CB_RESET_SECONDS = float(os.environ.get("RESERVIO_CB_RESET_SECONDS", "30"))
+
+# Client-side rate limit shared by all endpoints (requests/second, 0 disables); keep it under the API key's quota.
+# The quota is split between the WEB_CONCURRENCY server processes (set by gunicorn.conf.py).
+RESERVIO_RATE_LIMIT = float(os.environ.get("RESERVIO_RATE_LIMIT", "10"))
+RESERVIO_RATE_BURST = int(os.environ.get("RESERVIO_RATE_BURST", "20"))
+_PROCESSES = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+# Longest a call may queue for a token before it is given up on (served from cache instead)
+RESERVIO_RATE_LIMIT_MAX_WAIT = float(os.environ.get("RESERVIO_RATE_LIMIT_MAX_WAIT", "1"))
+
+# Hedged GETs: if a call has not answered after the endpoint's recent p95 latency, send a second one
+RESERVIO_HEDGE = os.environ.get("RESERVIO_HEDGE", "0") == "1"
+RESERVIO_HEDGE_MIN_DELAY = float(os.environ.get("RESERVIO_HEDGE_MIN_DELAY", "0.05"))
+# Samples needed before the p95 is trusted; no hedging until then
+RESERVIO_HEDGE_MIN_SAMPLES = int(os.environ.get("RESERVIO_HEDGE_MIN_SAMPLES", "20"))
+
+_client: Optional[httpx.AsyncClient] = None
+_client_lock = threading.Lock()
+
+_breakers: Dict[str, CircuitBreaker] = {
+    endpoint: CircuitBreaker(endpoint, RESERVIO_CB_FAILURES, RESERVIO_CB_RESET_SECONDS)
+    for endpoint in RESERVIO_TIMEOUTS
+}
+_rate_limiter = TokenBucket(RESERVIO_RATE_LIMIT / _PROCESSES, max(1, RESERVIO_RATE_BURST // _PROCESSES))
+_latency: Dict[str, LatencyWindow] = {endpoint: LatencyWindow() for endpoint in RESERVIO_TIMEOUTS}
+_hedge_stats: Dict[str, int] = {"hedged": 0, "skipped_rate_limit": 0}
+
+_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}  # (kind, business id) -> (fetched_at, value)
+_cache_inflight: Dict[Tuple[str, str], "asyncio.Task[Any]"] = {}
+# (business id, service id, resource id) -> {UTC day: _DayBucket of slots starting that day}
+_slot_cache: Dict[Tuple[str, str, str], Dict[date, "_DayBucket"]] = {}
+_cache_stats: Dict[str, int] = {
+    "hits": 0,
+    "stale_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "refreshes": 0,
+    "invalidations": 0,
+    "slot_day_hits": 0,
+    "slot_day_misses": 0,
+    "shared_hits": 0,
+}
+
+# Pool counters, exposed through get_pool_stats()
+_pool_stats: Dict[str, int] = {
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "saturated": 0,
+    "new_connections": 0,
+}
+
+
 def _auth_headers() -> Dict[str, str]:
     api_key = os.environ.get("RESERVIO_API_KEY")
     headers: Dict[str, str] = {"Accept": "application/json"}
@@ -29,19 +124,480 @@ def _auth_headers() -> Dict[str, str]:
     return headers
 
 
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=RESERVIO_MAX_CONNECTIONS,
+        max_keepalive_connections=RESERVIO_MAX_KEEPALIVE,
+        keepalive_expiry=RESERVIO_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        max(RESERVIO_TIMEOUTS.values()),
+        connect=RESERVIO_CONNECT_TIMEOUT,
+        pool=RESERVIO_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=HTTP2_AVAILABLE,
+        headers=_auth_headers(),
+    )
+
+
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared Reservio client off the event loop (TLS setup is slow; called at app startup)."""
+    return await asyncio.to_thread(get_client)
+
+
+async def close_client() -> None:
+    """Close the shared Reservio client (called at app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # Lazily create the client on first use (startup warm-up thread, scripts, REPL)
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                _client = _build_client()
+    return _client
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_pool_stats)
+    stats["reused_connections"] = max(0, stats["requests"] - stats["new_connections"])
+    stats["max_connections"] = RESERVIO_MAX_CONNECTIONS
+    stats["max_keepalive_connections"] = RESERVIO_MAX_KEEPALIVE
+    stats["http2"] = HTTP2_AVAILABLE
+    return stats
+
+
+async def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    # httpcore trace hook: a completed TCP connect means the pool opened a new connection
+    if event_name == "connection.connect_tcp.complete":
+        _pool_stats["new_connections"] += 1
+
+
+async def _attempt(endpoint: str, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    client = get_client()
+    _pool_stats["requests"] += 1
+    _pool_stats["in_flight"] += 1
+    if _pool_stats["in_flight"] > _pool_stats["peak_in_flight"]:
+        _pool_stats["peak_in_flight"] = _pool_stats["in_flight"]
+    if _pool_stats["in_flight"] > RESERVIO_MAX_CONNECTIONS:
+        _pool_stats["saturated"] += 1
+    start = time.perf_counter()
+    try:
+        resp = await client.get(
+            url,
+            params=params,
+            timeout=httpx.Timeout(
+                RESERVIO_TIMEOUTS[endpoint],
+                connect=RESERVIO_CONNECT_TIMEOUT,
+                pool=RESERVIO_POOL_TIMEOUT,
+            ),
+            extensions={"trace": _trace},
+        )
+    except Exception as e:
+        _pool_stats["errors"] += 1
+        metrics.UPSTREAM_ERRORS.inc(upstream="reservio", endpoint=endpoint, reason=type(e).__name__)
+        raise
+    finally:
+        _pool_stats["in_flight"] -= 1
+        elapsed = time.perf_counter() - start
+        metrics.STAGE_SECONDS.observe(elapsed, stage=f"reservio_{endpoint}")
+    if resp.status_code >= 400:
+        metrics.UPSTREAM_ERRORS.inc(upstream="reservio", endpoint=endpoint, reason=f"http_{resp.status_code}")
+    if _usable(resp):
+        _latency[endpoint].add(elapsed)
+    return resp
+
+
+def _usable(resp: httpx.Response) -> bool:
+    # 5xx and 429 mean Reservio is struggling; other statuses are answers (even a 404)
+    return resp.status_code < 500 and resp.status_code != 429
+
+
+def _hedge_delay(endpoint: str) -> Optional[float]:
+    window = _latency[endpoint]
+    if not RESERVIO_HEDGE or len(window) < RESERVIO_HEDGE_MIN_SAMPLES:
+        return None
+    return max(RESERVIO_HEDGE_MIN_DELAY, window.percentile(95) or 0.0)
+
+
+def _allow_hedge() -> bool:
+    # A hedge must not queue behind the rate limit: only send it if a token is free right now
+    if not _rate_limiter.try_acquire():
+        _hedge_stats["skipped_rate_limit"] += 1
+        return False
+    _hedge_stats["hedged"] += 1
+    return True
+
+
+async def _get(endpoint: str, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+    """GET through the endpoint's circuit breaker and the shared rate limit (hedged when enabled).
+
+    Raises CircuitOpenError / RateLimitedError without calling Reservio; callers treat every
+    exception as "no fresh data" and fall back to the last known-good cached value.
+    """
+    breaker = _breakers[endpoint]
+    if not breaker.allow():
+        metrics.UPSTREAM_ERRORS.inc(upstream="reservio", endpoint=endpoint, reason="circuit_open")
+        raise CircuitOpenError(f"Reservio {endpoint} circuit is open")
+    try:
+        await _rate_limiter.acquire(RESERVIO_RATE_LIMIT_MAX_WAIT)
+        resp = await hedged(
+            lambda: _attempt(endpoint, url, params),
+            _hedge_delay(endpoint),
+            accept=_usable,
+            on_hedge=_allow_hedge,
+        )
+    except RateLimitedError:
+        # Our own throttling says nothing about Reservio's health
+        breaker.release()
+        metrics.UPSTREAM_ERRORS.inc(upstream="reservio", endpoint=endpoint, reason="rate_limited")
+        raise
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    if _usable(resp):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    return resp
+
+
+def circuit_open(endpoint: str) -> bool:
+    """True while calls to the endpoint fail fast (answers come from cached data only)."""
+    return _breakers[endpoint].state != CLOSED
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {
+        "circuits": {endpoint: breaker.get_stats() for endpoint, breaker in _breakers.items()},
+        "rate_limit": dict(_rate_limiter.stats, per_second=_rate_limiter.rate, burst=_rate_limiter.burst),
+        "hedging": dict(_hedge_stats, enabled=RESERVIO_HEDGE),
+    }
+    stats["hedging"]["p95_ms"] = {
+        endpoint: round((window.percentile(95) or 0.0) * 1000, 1) for endpoint, window in _latency.items()
+    }
+    return stats
+
+
+# Shared entries are keyed by a generation that invalidation replaces: one write retires all
+# of them at once (the store cannot list keys), and the old ones expire with their TTL
+_GENERATION_KEY = "reservio:generation"
+_GENERATION_TTL = 30 * 86400
+
+
+async def _shared_generation() -> str:
+    if not state.STATE_BACKEND_URL:
+        return ""
+    try:
+        return await state.get_store().get(_GENERATION_KEY) or "0"
+    except Exception:
+        return "0"  # shared store down: _shared_get/_shared_set fail the same way
+
+
+async def _bump_shared_generation() -> None:
+    if state.STATE_BACKEND_URL:
+        await state.get_store().set(_GENERATION_KEY, secrets.token_hex(4), _GENERATION_TTL)
+
+
+def _shared_key(generation: str, *parts: Any) -> str:
+    return f"reservio:{generation}:" + ":".join(str(p) for p in parts)
+
+
+async def _shared_get(key: str) -> Optional[Tuple[float, Any]]:
+    """(age seconds, value) another process stored under key, when STATE_BACKEND_URL is set."""
+    if not state.STATE_BACKEND_URL:
+        return None
+    try:
+        entry = await state.get_store().get(key)
+    except Exception:
+        return None  # shared store down: behave like a per-process cache
+    if entry is None:
+        return None
+    return max(0.0, time.time() - entry["fetched_at"]), entry["value"]
+
+
+async def _shared_set(key: str, value: Any, ttl: float) -> None:
+    if not state.STATE_BACKEND_URL:
+        return
+    try:
+        await state.get_store().set(key, {"fetched_at": time.time(), "value": value}, ttl)
+    except Exception:
+        pass
+
+
+async def _load_into_cache(key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+    try:
+        # Another server process may have fetched it already
+        generation = await _shared_generation()
+        shared = await _shared_get(_shared_key(generation, *key))
+        if shared is not None and shared[0] < RESERVIO_CACHE_TTL:
+            _cache_stats["shared_hits"] += 1
+            _cache[key] = (time.monotonic() - shared[0], shared[1])
+            return shared[1]
+        value = await fetch()
+        if value:
+            _cache[key] = (time.monotonic(), value)
+            await _shared_set(_shared_key(generation, *key), value, RESERVIO_CACHE_TTL)
+            return value
+        # Upstream failed or returned nothing: keep serving the last known value if we have one
+        entry = _cache.get(key)
+        return entry[1] if entry is not None else value
+    finally:
+        _cache_inflight.pop(key, None)
+
+
+def _start_load(key: Tuple[str, str], fetch: Callable[[], Awaitable[Any]]) -> "asyncio.Task[Any]":
+    # Coalesce concurrent loads of the same key into a single upstream call
+    task = _cache_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load_into_cache(key, fetch))
+        _cache_inflight[key] = task
+    else:
+        _cache_stats["coalesced"] += 1
+    return task
+
+
+async def _cached(kind: str, bid: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    key = (kind, bid)
+    entry = _cache.get(key)
+    if entry is not None:
+        age = time.monotonic() - entry[0]
+        if age < RESERVIO_CACHE_TTL:
+            _cache_stats["hits"] += 1
+            return entry[1]
+        if age < RESERVIO_CACHE_TTL + RESERVIO_CACHE_STALE_TTL:
+            # Stale-while-revalidate: answer now, refresh in the background
+            _cache_stats["stale_hits"] += 1
+            if key not in _cache_inflight:
+                _cache_stats["refreshes"] += 1
+            _start_load(key, fetch)
+            return entry[1]
+    _cache_stats["misses"] += 1
+    # Shield so a cancelled caller does not cancel the load other callers are waiting on
+    return await asyncio.shield(_start_load(key, fetch))
+
+
+async def invalidate_cache(business_id: Optional[str] = None) -> int:
+    """Drop cached business info, services and availability; all businesses when business_id is None.
+
+    Returns the in-process entries dropped. Shared entries (STATE_BACKEND_URL) are retired for
+    every business; other workers' in-process copies expire with their TTL.
+    """
+    keys = [k for k in _cache if business_id is None or k[1] == business_id]
+    for key in keys:
+        _cache.pop(key, None)
+    _cache_stats["invalidations"] += 1
+    return len(keys) + await invalidate_slots(business_id)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_cache_stats)
+    stats["entries"] = len(_cache)
+    stats["slot_day_buckets"] = sum(len(b) for b in _slot_cache.values())
+    stats["slot_ttl_seconds"] = RESERVIO_SLOT_CACHE_TTL
+    stats["ttl_seconds"] = RESERVIO_CACHE_TTL
+    stats["stale_ttl_seconds"] = RESERVIO_CACHE_STALE_TTL
+    return stats
+
+
 async def get_business_info(business_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
     bid = business_id or DEFAULT_BUSINESS_ID
+    return await _cached("business", bid, lambda: _fetch_business_info(bid))
+
+
+async def _fetch_business_info(bid: str) -> Optional[Dict[str, Any]]:
     url = f"{RESERVIO_BASE_URL}/businesses/{bid}"
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url, headers=_auth_headers())
-            if resp.status_code == 200:
-                return resp.json().get("data", {}).get("attributes")
+        resp = await _get("business", url)
+        if resp.status_code == 200:
+            return resp.json().get("data", {}).get("attributes")
     except Exception:
         pass
     return None
 
 
+def _format_utc(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return dt.isoformat(timespec="seconds") + "Z"
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt.replace(tzinfo=dt_timezone.utc) if dt.tzinfo is None else dt.astimezone(dt_timezone.utc)
+
+
+_EPOCH_DAY = date(1970, 1, 1)
+
+
+def _utc_day(epoch: int) -> date:
+    return _EPOCH_DAY + timedelta(days=epoch // 86400)
+
+
+class _DayBucket:
+    """Slots starting on one UTC day: raw items (with start epoch) plus their SlotIndex."""
+
+    __slots__ = ("fetched_at", "items", "index")
+
+    def __init__(self, fetched_at: float, items: List[Tuple[int, Dict[str, Any]]], index: "SlotIndex"):
+        self.fetched_at = fetched_at
+        self.items = items
+        self.index = index
+
+
+def _missing_runs(days: List[date], buckets: Dict[date, _DayBucket], now: float) -> List[Tuple[date, date]]:
+    """Group days without a fresh bucket into contiguous [first, last] runs."""
+    missing: List[date] = []
+    for day in days:
+        bucket = buckets.get(day)
+        if bucket is not None and now - bucket.fetched_at < RESERVIO_SLOT_CACHE_TTL:
+            _cache_stats["slot_day_hits"] += 1
+            continue
+        _cache_stats["slot_day_misses"] += 1
+        missing.append(day)
+    return _group_runs(missing)
+
+
+def _group_runs(days: List[date]) -> List[Tuple[date, date]]:
+    runs: List[Tuple[date, date]] = []
+    for day in days:
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+async def _load_shared_days(
+    generation: str,
+    key: Tuple[str, str, str],
+    buckets: Dict[date, _DayBucket],
+    runs: List[Tuple[date, date]],
+) -> List[Tuple[date, date]]:
+    """Fill missing days from slots other server processes fetched; returns the runs still missing."""
+    days: List[date] = []
+    for first, last in runs:
+        day = first
+        while day <= last:
+            days.append(day)
+            day += timedelta(days=1)
+    found = await asyncio.gather(*(_shared_get(_shared_key(generation, "slots", *key, day.isoformat())) for day in days))
+    still_missing: List[date] = []
+    for day, shared in zip(days, found):
+        if shared is None or shared[0] >= RESERVIO_SLOT_CACHE_TTL:
+            still_missing.append(day)
+            continue
+        _cache_stats["shared_hits"] += 1
+        _store_buckets(buckets, day, day, shared[1], fetched_at=time.monotonic() - shared[0])
+    return _group_runs(still_missing)
+
+
+async def _share_days(
+    generation: str,
+    key: Tuple[str, str, str],
+    buckets: Dict[date, _DayBucket],
+    first: date,
+    last: date,
+) -> None:
+    writes = []
+    day = first
+    while day <= last:
+        items = [item for _, item in buckets[day].items]
+        writes.append(_shared_set(_shared_key(generation, "slots", *key, day.isoformat()), items, RESERVIO_SLOT_CACHE_TTL))
+        day += timedelta(days=1)
+    await asyncio.gather(*writes)
+
+
+def _store_buckets(
+    buckets: Dict[date, _DayBucket],
+    first: date,
+    last: date,
+    fetched: List[Dict[str, Any]],
+    fetched_at: Optional[float] = None,
+) -> None:
+    # Parse every slot exactly once and file it under the UTC day it starts on
+    if fetched_at is None:
+        fetched_at = time.monotonic()
+    items: Dict[date, List[Tuple[int, Dict[str, Any]]]] = {}
+    pairs: Dict[date, set] = {}
+    parsed: Dict[str, int] = {}
+    d = first
+    while d <= last:
+        items[d] = []
+        pairs[d] = set()
+        d += timedelta(days=1)
+    for item in fetched:
+        attributes = item.get("attributes") or {}
+        start_iso = attributes.get("start")
+        end_iso = attributes.get("end")
+        if not start_iso or not end_iso:
+            continue
+        try:
+            start_epoch = parsed.get(start_iso)
+            if start_epoch is None:
+                start_epoch = parsed[start_iso] = _epoch(start_iso)
+            end_epoch = parsed.get(end_iso)
+            if end_epoch is None:
+                end_epoch = parsed[end_iso] = _epoch(end_iso)
+        except ValueError:
+            continue
+        day = _utc_day(start_epoch)
+        if day in items:
+            items[day].append((start_epoch, item))
+            pairs[day].add((start_epoch, end_epoch))
+    for day, day_items in items.items():
+        ordered = sorted(pairs[day])
+        index = SlotIndex([p[0] for p in ordered], [p[1] for p in ordered])
+        buckets[day] = _DayBucket(fetched_at, day_items, index)
+
+
+async def _fill_slot_buckets(
+    bid: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    service_id: Optional[str],
+    resource_id: Optional[str],
+) -> Tuple[Dict[date, _DayBucket], List[date], bool]:
+    """(buckets, days of the window, complete); complete is False when a day could not be
+    fetched and has no cached (even stale) bucket to fall back on."""
+    key = (bid, service_id or "", resource_id or "")
+    buckets = _slot_cache.setdefault(key, {})
+
+    # Only fetch the UTC days that are not cached yet (or whose bucket expired)
+    days: List[date] = []
+    day = start_utc.date()
+    while day <= end_utc.date():
+        days.append(day)
+        day += timedelta(days=1)
+    runs = _missing_runs(days, buckets, time.monotonic())
+    generation = ""
+    if runs and state.STATE_BACKEND_URL:
+        generation = await _shared_generation()
+        runs = await _load_shared_days(generation, key, buckets, runs)
+    for first, last in runs:
+        run_start = datetime.combine(first, datetime.min.time(), tzinfo=dt_timezone.utc)
+        run_end = datetime.combine(last + timedelta(days=1), datetime.min.time(), tzinfo=dt_timezone.utc)
+        fetched = await _fetch_booking_slots(bid, run_start, run_end, service_id, resource_id)
+        if fetched is None:
+            # Upstream failed: keep whatever (possibly stale) buckets we have for these days
+            continue
+        _store_buckets(buckets, first, last, fetched)
+        if state.STATE_BACKEND_URL:
+            await _share_days(generation, key, buckets, first, last)
+    _prune_slot_cache()
+    return buckets, days, all(day in buckets for day in days)
+
+
 async def get_booking_slots(
     *,
     business_id: Optional[str] = None,
@@ -51,10 +607,56 @@ async def get_booking_slots(
     resource_id: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
     bid = business_id or DEFAULT_BUSINESS_ID
+    start_utc = _as_utc(start_utc)
+    end_utc = _as_utc(end_utc)
+    buckets, days, _ = await _fill_slot_buckets(bid, start_utc, end_utc, service_id, resource_id)
+
+    start_epoch = start_utc.timestamp()
+    end_epoch = end_utc.timestamp()
+    slots: List[Dict[str, Any]] = []
+    for day in days:
+        bucket = buckets.get(day)
+        if bucket is None:
+            continue
+        for slot_start, item in bucket.items:
+            if start_epoch <= slot_start <= end_epoch:
+                slots.append(item)
+    return slots
+
 
+async def get_slot_index(
+    *,
+    business_id: Optional[str] = None,
+    start_utc: datetime,
+    end_utc: datetime,
+    service_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+) -> Optional["SlotIndex"]:
+    """Like get_booking_slots, but returns the pre-parsed SlotIndex built when the days were fetched.
+
+    None when availability could not be fetched (error, timeout, rate limit, open circuit) and
+    is not cached; an empty index means there really are no free slots.
+    """
+    bid = business_id or DEFAULT_BUSINESS_ID
+    start_utc = _as_utc(start_utc)
+    end_utc = _as_utc(end_utc)
+    buckets, days, complete = await _fill_slot_buckets(bid, start_utc, end_utc, service_id, resource_id)
+    if not complete:
+        return None
+    index = concat_slot_indexes([buckets[day].index for day in days if day in buckets])
+    return index.window(int(start_utc.timestamp()), int(end_utc.timestamp()))
+
+
+async def _fetch_booking_slots(
+    bid: str,
+    start_utc: datetime,
+    end_utc: datetime,
+    service_id: Optional[str],
+    resource_id: Optional[str],
+) -> Optional[List[Dict[str, Any]]]:
     params = {
-        "filter[from]": start_utc.isoformat(timespec="seconds") + "Z",
-        "filter[to]": end_utc.isoformat(timespec="seconds") + "Z",
+        "filter[from]": _format_utc(start_utc),
+        "filter[to]": _format_utc(end_utc),
     }
     if service_id:
         params["filter[serviceId]"] = service_id
@@ -63,18 +665,122 @@ async def get_booking_slots(
 
     url = f"{RESERVIO_BASE_URL}/businesses/{bid}/availability/booking-slots"
     try:
-        async with httpx.AsyncClient(timeout=12.0) as client:
-            resp = await client.get(url, params=params, headers=_auth_headers())
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("data", [])
+        resp = await _get("slots", url, params=params)
+        if resp.status_code == 200:
+            data = resp.json()
+            return data.get("data", [])
     except Exception:
         pass
-    return []
+    return None
+
+
+def _prune_slot_cache() -> None:
+    # Drop buckets for days that are over, so the cache does not grow forever
+    today = datetime.now(dt_timezone.utc).date()
+    for buckets in _slot_cache.values():
+        for day in [d for d in buckets if d < today]:
+            del buckets[day]
+
+
+async def invalidate_slots(
+    business_id: Optional[str] = None,
+    service_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+) -> int:
+    """Drop cached availability (call after a booking); None matches everything.
+
+    Returns the in-process entries dropped. Shared entries, for every business and service, are
+    retired by replacing the generation key.
+    """
+    keys = [
+        k for k in _slot_cache
+        if (business_id is None or k[0] == business_id)
+        and (service_id is None or k[1] == service_id)
+        and (resource_id is None or k[2] == resource_id)
+    ]
+    for key in keys:
+        _slot_cache.pop(key, None)
+    await _bump_shared_generation()
+    return len(keys)
+
+
+UTC = dt_timezone.utc
+
+
+class SlotIndex:
+    """Deduplicated slots as parallel, start-sorted lists of UTC epoch seconds."""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, starts: List[int], ends: List[int]):
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def window(self, start_epoch: int, end_epoch: int) -> "SlotIndex":
+        """Slots starting within [start_epoch, end_epoch]."""
+        lo = bisect_left(self.starts, start_epoch)
+        hi = bisect_right(self.starts, end_epoch)
+        return SlotIndex(self.starts[lo:hi], self.ends[lo:hi])
+
+
+def _epoch(dt_str: str) -> int:
+    dt = datetime.fromisoformat(dt_str)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return int(dt.timestamp())
+
+
+def build_slot_index(slots: List[Dict[str, Any]]) -> SlotIndex:
+    """Parse each slot once; deduplicate by exact start/end (duplicates across resources)."""
+    # Dedupe on the raw strings first so duplicates are never parsed
+    raw = set()
+    for item in slots:
+        attributes = item.get("attributes") or {}
+        start_iso = attributes.get("start")
+        end_iso = attributes.get("end")
+        if start_iso and end_iso:
+            raw.add((start_iso, end_iso))
+    # Back-to-back slots share timestamps (one slot's end is another's start): parse each once
+    parsed: Dict[str, int] = {}
+    pairs = set()
+    for start_iso, end_iso in raw:
+        try:
+            start_epoch = parsed.get(start_iso)
+            if start_epoch is None:
+                start_epoch = parsed[start_iso] = _epoch(start_iso)
+            end_epoch = parsed.get(end_iso)
+            if end_epoch is None:
+                end_epoch = parsed[end_iso] = _epoch(end_iso)
+        except ValueError:
+            continue
+        pairs.add((start_epoch, end_epoch))
+    ordered = sorted(pairs)
+    return SlotIndex([p[0] for p in ordered], [p[1] for p in ordered])
+
+
+def concat_slot_indexes(indexes: List[SlotIndex]) -> SlotIndex:
+    # Indexes must be disjoint and given in start order (e.g. consecutive day buckets)
+    starts: List[int] = []
+    ends: List[int] = []
+    for index in indexes:
+        starts.extend(index.starts)
+        ends.extend(index.ends)
+    return SlotIndex(starts, ends)
+
+
+@lru_cache(maxsize=32)
+def _resolve_tz(name: str):
+    try:
+        return ZoneInfo(name) if ZoneInfo is not None else None
+    except Exception:
+        return None
 
 
 def summarize_slots(
-    slots: List[Dict[str, Any]],
+    slots: Union[List[Dict[str, Any]], SlotIndex],
     limit: int = 10,
     timezone: Optional[str] = None,
     min_duration_minutes: Optional[int] = None,
@@ -82,103 +788,174 @@ def summarize_slots(
     open_hour_local: Optional[int] = None,
     close_hour_local: Optional[int] = None,
     annotate_last_start: bool = False,
+    offset: int = 0,
 ) -> str:
+    """Slot summary for the reply. Pass a SlotIndex (get_slot_index) where speed matters: a raw
+    list is parsed and indexed on every call, about as slow as parsing it per slot."""
     if not slots:
         return "No available booking slots were found in the requested window."
 
-    # Deduplicate by exact start/end to avoid duplicates across resources
-    unique: Dict[str, Dict[str, Any]] = {}
-    for item in slots:
-        attributes = item.get("attributes", {})
-        start_iso = attributes.get("start")
-        end_iso = attributes.get("end")
-        if not start_iso or not end_iso:
-            continue
-        key = f"{start_iso}|{end_iso}"
-        if key not in unique:
-            unique[key] = attributes
+    index = slots if isinstance(slots, SlotIndex) else build_slot_index(slots)
+    lines = slot_lines(
+        index,
+        timezone=timezone,
+        min_duration_minutes=min_duration_minutes,
+        not_before_utc=not_before_utc,
+        open_hour_local=open_hour_local,
+        close_hour_local=close_hour_local,
+        offset=offset,
+        limit=limit,
+    )
+    if not lines:
+        return "Slots data available but could not be parsed."
+    return format_slot_lines(lines, annotate_last_start=annotate_last_start)
 
-    # Sort by start time
-    def parse_iso(dt_str: str) -> datetime:
-        # datetime.fromisoformat supports "+02:00" offsets
-        return datetime.fromisoformat(dt_str)
 
-    tzinfo = None
-    if timezone:
-        try:
-            tzinfo = ZoneInfo(timezone) if ZoneInfo is not None else None
-        except Exception:
-            tzinfo = None
-
-    sorted_items = sorted(unique.values(), key=lambda a: parse_iso(a["start"]))
-
-    lines: List[str] = []
-    kept_local_times: List[tuple] = []  # (start_local_dt, end_local_dt)
-    for attributes in sorted_items:
-        start_dt = parse_iso(attributes["start"])  # aware
-        end_dt = parse_iso(attributes["end"])      # aware
-        # Skip slots that start before not_before_utc; compare in UTC
-        if isinstance(not_before_utc, datetime):
-            # Convert both datetimes to UTC using a robust fallback if tzdata is unavailable
-            try:
-                from datetime import timezone as dt_timezone
-                utc = ZoneInfo("UTC") if ZoneInfo is not None else dt_timezone.utc
-            except Exception:
-                from datetime import timezone as dt_timezone
-                utc = dt_timezone.utc
-
-            start_dt_utc = start_dt.astimezone(utc)
-            nbu = not_before_utc
-            if nbu.tzinfo is None:
-                nbu = nbu.replace(tzinfo=utc)
-            else:
-                nbu = nbu.astimezone(utc)
-            if start_dt_utc < nbu:
-                continue
-        # Filter by minimum duration if provided
-        if isinstance(min_duration_minutes, int) and min_duration_minutes > 0:
-            total_minutes = int((end_dt - start_dt).total_seconds() // 60)
-            if total_minutes < min_duration_minutes:
-                continue
-        if tzinfo is not None:
-            start_dt = start_dt.astimezone(tzinfo)
-            end_dt = end_dt.astimezone(tzinfo)
-        # Filter by business hours if provided (local time comparisons)
-        if isinstance(open_hour_local, int) and isinstance(close_hour_local, int):
-            if not (0 <= open_hour_local <= 23 and 0 <= close_hour_local <= 23):
-                pass
-            else:
-                # Require slot fully within [open, close]
-                if start_dt.hour < open_hour_local:
-                    continue
-                if end_dt.hour > close_hour_local or (end_dt.hour == close_hour_local and end_dt.minute > 0):
-                    continue
-        # Display AM/PM for clarity
-        start_str = start_dt.strftime("%I:%M %p").lstrip('0')
-        end_str = end_dt.strftime("%I:%M %p").lstrip('0')
-        kept_local_times.append((start_dt, end_dt))
-        lines.append(f"- {start_str}–{end_str}")
-        if len(lines) >= limit:
-            break
+def slot_lines(
+    index: SlotIndex,
+    *,
+    timezone: Optional[str] = None,
+    min_duration_minutes: Optional[int] = None,
+    not_before_utc: Optional[datetime] = None,
+    open_hour_local: Optional[int] = None,
+    close_hour_local: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> List[str]:
+    """Display lines ("- start–end") for the slots passing all filters; limit=None returns all."""
+    tzinfo = _resolve_tz(timezone) if timezone else None
+    return [f"- {start_str}–{end_str}" for start_str, end_str in iter_slot_times(
+        index,
+        tzinfo=tzinfo,
+        min_duration_minutes=min_duration_minutes,
+        not_before_utc=not_before_utc,
+        open_hour_local=open_hour_local,
+        close_hour_local=close_hour_local,
+        offset=offset,
+        limit=limit,
+    )]
 
-    if not lines:
-        return "Slots data available but could not be parsed."
-    if annotate_last_start and kept_local_times:
-        last_start = kept_local_times[-1][0]
+
+def format_slot_lines(lines: List[str], annotate_last_start: bool = False) -> str:
+    if annotate_last_start and lines:
         # annotate last line
-        lines[-1] = lines[-1] + " (last start today)"
+        lines = lines[:-1] + [lines[-1] + " (last start today)"]
     return "Here are some available times (Europe/Prague):\n" + "\n".join(lines)
 
 
+def iter_slot_times(
+    index: SlotIndex,
+    *,
+    tzinfo=None,
+    min_duration_minutes: Optional[int] = None,
+    not_before_utc: Optional[datetime] = None,
+    open_hour_local: Optional[int] = None,
+    close_hour_local: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[Tuple[str, str]]:
+    """Yield (start, end) display strings for slots passing all filters, in one pass."""
+    for _, start_dt, end_dt in _passing_slots(
+        index,
+        tzinfo=tzinfo,
+        min_duration_minutes=min_duration_minutes,
+        not_before_utc=not_before_utc,
+        open_hour_local=open_hour_local,
+        close_hour_local=close_hour_local,
+        offset=offset,
+        limit=limit,
+    ):
+        # Display AM/PM for clarity
+        yield start_dt.strftime("%I:%M %p").lstrip('0'), end_dt.strftime("%I:%M %p").lstrip('0')
+
+
+def slot_entries(
+    index: SlotIndex,
+    *,
+    timezone: Optional[str] = None,
+    min_duration_minutes: Optional[int] = None,
+    open_hour_local: Optional[int] = None,
+    close_hour_local: Optional[int] = None,
+) -> List[Tuple[int, str]]:
+    """(start epoch, display line) for every slot passing the filters; lines match slot_lines()."""
+    tzinfo = _resolve_tz(timezone) if timezone else None
+    return [
+        (start_epoch, f"- {start_dt.strftime('%I:%M %p').lstrip('0')}–{end_dt.strftime('%I:%M %p').lstrip('0')}")
+        for start_epoch, start_dt, end_dt in _passing_slots(
+            index,
+            tzinfo=tzinfo,
+            min_duration_minutes=min_duration_minutes,
+            open_hour_local=open_hour_local,
+            close_hour_local=close_hour_local,
+        )
+    ]
+
+
+def _passing_slots(
+    index: SlotIndex,
+    *,
+    tzinfo=None,
+    min_duration_minutes: Optional[int] = None,
+    not_before_utc: Optional[datetime] = None,
+    open_hour_local: Optional[int] = None,
+    close_hour_local: Optional[int] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Iterator[Tuple[int, datetime, datetime]]:
+    starts = index.starts
+    ends = index.ends
+    tz = tzinfo or UTC
+
+    # Skip slots that start before not_before_utc (starts are sorted, so bisect)
+    lo = 0
+    if isinstance(not_before_utc, datetime):
+        nbu = not_before_utc if not_before_utc.tzinfo is not None else not_before_utc.replace(tzinfo=UTC)
+        lo = bisect_left(starts, nbu.timestamp())
+    min_seconds = None
+    if isinstance(min_duration_minutes, int) and min_duration_minutes > 0:
+        min_seconds = min_duration_minutes * 60
+    hours = None
+    if isinstance(open_hour_local, int) and isinstance(close_hour_local, int):
+        if 0 <= open_hour_local <= 23 and 0 <= close_hour_local <= 23:
+            hours = (open_hour_local, close_hour_local)
+
+    skipped = 0
+    produced = 0
+    for i in range(lo, len(starts)):
+        start_epoch = starts[i]
+        end_epoch = ends[i]
+        # Filter by minimum duration if provided
+        if min_seconds is not None and end_epoch - start_epoch < min_seconds:
+            continue
+        start_dt = datetime.fromtimestamp(start_epoch, tz)
+        end_dt = datetime.fromtimestamp(end_epoch, tz)
+        # Filter by business hours if provided (local time comparisons); slot fully within [open, close]
+        if hours is not None:
+            if start_dt.hour < hours[0]:
+                continue
+            if end_dt.hour > hours[1] or (end_dt.hour == hours[1] and end_dt.minute > 0):
+                continue
+        if skipped < offset:
+            skipped += 1
+            continue
+        yield start_epoch, start_dt, end_dt
+        produced += 1
+        if limit is not None and produced >= limit:
+            return
+
+
 async def get_services(business_id: Optional[str] = None) -> List[Dict[str, Any]]:
     bid = business_id or DEFAULT_BUSINESS_ID
+    return await _cached("services", bid, lambda: _fetch_services(bid))
+
+
+async def _fetch_services(bid: str) -> List[Dict[str, Any]]:
     url = f"{RESERVIO_BASE_URL}/businesses/{bid}/services"
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url, headers=_auth_headers(), params={"page[limit]": 50, "page[offset]": 0})
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("data", [])
+        resp = await _get("services", url, params={"page[limit]": 50, "page[offset]": 0})
+        if resp.status_code == 200:
+            data = resp.json()
+            return data.get("data", [])
     except Exception:
         pass
     return []
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class RateLimitedError(Exception):
+    """Raised when the client-side rate limit would make a call wait too long."""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails fast for `reset_timeout`
+    seconds; then lets a single probe through (half-open) and closes again if it succeeds."""
+
+    __slots__ = ("name", "failure_threshold", "reset_timeout", "state", "failures", "opened_at", "_probe_in_flight", "stats")
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats: Dict[str, int] = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            self.stats["probes"] += 1
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        """The call ended without a verdict (cancelled, rate limited): free the probe slot."""
+        self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["state"] = self.state
+        stats["consecutive_failures"] = self.failures
+        if self.state == OPEN:
+            stats["retry_in_seconds"] = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        return stats
+
+
+class TokenBucket:
+    """Client-side rate limit: `rate` requests per second with bursts of up to `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at", "stats")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.stats: Dict[str, Any] = {"waited": 0, "rejected": 0, "wait_seconds": 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self, max_wait: float) -> None:
+        """Take a token, waiting up to max_wait seconds; raises RateLimitedError beyond that."""
+        if self.try_acquire():
+            return
+        # Reserve the next token now (tokens may go negative) so waiters are served in order
+        wait = (1 - self.tokens) / self.rate
+        if wait > max_wait:
+            self.stats["rejected"] += 1
+            raise RateLimitedError(f"rate limit would delay the call by {wait:.2f}s")
+        self.tokens -= 1
+        self.stats["waited"] += 1
+        self.stats["wait_seconds"] += wait
+        await asyncio.sleep(wait)
+
+
+class LatencyWindow:
+    """Latencies of the last `size` successful calls, for percentile-based hedging delays."""
+
+    __slots__ = ("_samples",)
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    accept: Callable[[T], bool] = lambda result: True,
+    on_hedge: Optional[Callable[[], bool]] = None,
+) -> T:
+    """Run call(); if it has not finished after `delay` seconds, start a second identical call
+    and return whichever acceptable result comes first (for idempotent requests only).
+
+    on_hedge() runs before the second call and can veto it by returning False.
+    """
+    if delay is None:
+        return await call()
+    first = asyncio.ensure_future(call())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and (on_hedge is None or on_hedge()):
+            tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        fallback: Optional["asyncio.Future[T]"] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and accept(task.result()):
+                    return task.result()
+                fallback = fallback or task
+        # Nothing acceptable: surface the first attempt's outcome
+        return first.result() if first.done() else fallback.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,184 @@
+"""Archive and drop old conversation data.
+
+Partitioned tables: every monthly partition older than RETENTION_MONTHS is
+written to ARCHIVE_DIR as gzipped JSONL, then detached and dropped. Rows that
+ended up in the default partition are archived and deleted the same way when
+old; newer months are moved into their own monthly partition.
+Unpartitioned tables (older databases, SQLite): the same months are
+archived and their rows deleted.
+
+Run it daily, e.g. from cron:
+
+    cd ai_chatbot && python retention.py [--months 12] [--archive-dir archive] [--dry-run]
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from db import (
+    DEFAULT_PARTITION,
+    add_months,
+    conversations_partitioned,
+    default_partition_months,
+    engine,
+    month_start,
+    partition_name,
+)
+
+RETENTION_MONTHS = int(os.environ.get("RETENTION_MONTHS", "12"))
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "archive")
+
+_PARTITION_RE = re.compile(r"^conversations_(\d{4})_(\d{2})$")
+
+_PARTITIONS_SQL = """
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+WHERE p.relname = 'conversations' AND pg_table_is_visible(p.oid)
+"""
+
+_COLUMNS = "id, user_number, user_message, bot_reply, timestamp"
+
+
+def _old_partitions(conn, cutoff: date) -> List[Tuple[str, date]]:
+    old = []
+    for (name,) in conn.execute(text(_PARTITIONS_SQL)):
+        m = _PARTITION_RE.match(name)
+        if m:
+            month = date(int(m.group(1)), int(m.group(2)), 1)
+            if month < cutoff:
+                old.append((name, month))
+    return sorted(old, key=lambda p: p[1])
+
+
+def _month_range(month: date) -> dict:
+    return {"start": datetime.combine(month, datetime.min.time()),
+            "end": datetime.combine(add_months(month, 1), datetime.min.time())}
+
+
+def _partition_default_month(conn, month: date) -> None:
+    """Move one month's rows out of the default partition into a new monthly partition."""
+    name = partition_name(month)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE conversations INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+        f"RETURNING {_COLUMNS}) INSERT INTO {name} ({_COLUMNS}) SELECT {_COLUMNS} FROM moved"
+    ), _month_range(month))
+    # Attaching checks the default partition no longer holds rows for this range
+    conn.execute(text(
+        f"ALTER TABLE conversations ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def _clean_default_partition(cutoff: date, archive_dir: str, dry_run: bool) -> None:
+    with engine.connect() as conn:
+        stray = default_partition_months(conn)
+    where = "timestamp >= :start AND timestamp < :end"
+    for month, count in stray:
+        if month < cutoff:
+            # Named apart from the monthly partition archives so neither overwrites the other
+            path = os.path.join(archive_dir, f"{DEFAULT_PARTITION}_{month:%Y_%m}.jsonl.gz")
+            if dry_run:
+                print(f"  would archive and delete {count} rows of {month:%Y-%m} from {DEFAULT_PARTITION}")
+                continue
+            with engine.connect() as conn:
+                archived = _archive(
+                    conn, f"SELECT {_COLUMNS} FROM {DEFAULT_PARTITION} WHERE {where} ORDER BY timestamp",
+                    _month_range(month), path,
+                )
+            with engine.begin() as conn:
+                conn.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {where}"), _month_range(month))
+            print(f"  ✅ {DEFAULT_PARTITION} {month:%Y-%m}: {archived} rows archived and deleted")
+        else:
+            if dry_run:
+                print(f"  would move {count} rows of {month:%Y-%m} from {DEFAULT_PARTITION} to {partition_name(month)}")
+                continue
+            with engine.begin() as conn:
+                _partition_default_month(conn, month)
+            print(f"  ✅ {DEFAULT_PARTITION} {month:%Y-%m}: {count} rows moved to {partition_name(month)}")
+
+
+def _archive(conn, sql: str, params: dict, path: str) -> int:
+    """Stream the query result into path (gzipped JSONL); written to a temp file, then renamed."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    result = conn.execution_options(stream_results=True, yield_per=1000).execute(text(sql), params)
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        for row in result:
+            record = dict(row._mapping)
+            if isinstance(record.get("timestamp"), datetime):
+                record["timestamp"] = record["timestamp"].isoformat()
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    if count:
+        os.replace(tmp_path, path)
+    else:
+        os.remove(tmp_path)
+    return count
+
+
+def run(months: int, archive_dir: str, dry_run: bool = False) -> None:
+    cutoff = add_months(month_start(datetime.utcnow().date()), -months)
+    print(f"🗄️ Archiving conversations before {cutoff.isoformat()} to {archive_dir}/")
+
+    with engine.connect() as conn:
+        partitioned = conversations_partitioned(conn)
+
+    if partitioned:
+        with engine.connect() as conn:
+            old = _old_partitions(conn, cutoff)
+        for name, month in old:
+            path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+            if dry_run:
+                print(f"  would archive and drop {name}")
+                continue
+            with engine.connect() as conn:
+                count = _archive(conn, f"SELECT {_COLUMNS} FROM {name} ORDER BY timestamp", {}, path)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE conversations DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+            print(f"  ✅ {name}: {count} rows archived, partition dropped")
+        _clean_default_partition(cutoff, archive_dir, dry_run)
+        return
+
+    # Unpartitioned table: archive month by month, then delete those rows
+    with engine.connect() as conn:
+        oldest = conn.execute(text("SELECT MIN(timestamp) FROM conversations")).scalar()
+    if oldest is None:
+        return
+    if isinstance(oldest, str):  # SQLite returns text
+        oldest = datetime.fromisoformat(oldest)
+    month = month_start(oldest.date())
+    while month < cutoff:
+        next_month = add_months(month, 1)
+        params = _month_range(month)
+        where = "timestamp >= :start AND timestamp < :end"
+        path = os.path.join(archive_dir, f"{partition_name(month)}.jsonl.gz")
+        if dry_run:
+            print(f"  would archive and delete rows of {month:%Y-%m}")
+        else:
+            with engine.connect() as conn:
+                count = _archive(conn, f"SELECT {_COLUMNS} FROM conversations WHERE {where} ORDER BY timestamp", params, path)
+            if count:
+                with engine.begin() as conn:
+                    conn.execute(text(f"DELETE FROM conversations WHERE {where}"), params)
+                print(f"  ✅ {month:%Y-%m}: {count} rows archived and deleted")
+        month = next_month
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive and drop old conversations")
+    parser.add_argument("--months", type=int, default=RETENTION_MONTHS, help="months to keep online")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    run(args.months, args.archive_dir, args.dry_run)
@@ -0,0 +1,127 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from db import Conversation
+import state
+
+# Per-user conversation state: last turns and the selected service, so the hot path skips the DB
+SESSION_HISTORY_TURNS = int(os.environ.get("SESSION_HISTORY_TURNS", "5"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+SESSION_LRU_MAX = int(os.environ.get("SESSION_LRU_MAX", "10000"))
+
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "skipped_writes": 0}
+
+
+class LRUCache:
+    """Bounded in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            _stats["evictions"] += 1
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_local = LRUCache(SESSION_LRU_MAX)
+
+
+def _key(user_number: str) -> str:
+    return f"session:{user_number}"
+
+
+async def get_session(user_number: str) -> Optional[Dict[str, Any]]:
+    # With a shared backend every worker reads the same state; otherwise the local LRU is authoritative
+    if state.STATE_BACKEND_URL:
+        session = await state.get_store().get(_key(user_number))
+    else:
+        session = _local.get(user_number)
+    _stats["hits" if session is not None else "misses"] += 1
+    return session
+
+
+async def save_session(user_number: str, session: Dict[str, Any]) -> None:
+    if state.STATE_BACKEND_URL:
+        await state.get_store().set(_key(user_number), session, SESSION_TTL)
+    else:
+        _local.set(user_number, session, SESSION_TTL)
+
+
+def session_from_history(recent_messages: List[Conversation]) -> Dict[str, Any]:
+    """Seed a session from DB rows (newest first) after a cold start or expiry."""
+    return {
+        "turns": [
+            {
+                "user_message": conv.user_message or "",
+                "bot_reply": conv.bot_reply or "",
+                "timestamp": (conv.timestamp or datetime.utcnow()).isoformat(),
+            }
+            for conv in recent_messages[:SESSION_HISTORY_TURNS]
+        ],
+        "service_id": None,
+    }
+
+
+def history(session: Dict[str, Any]) -> List[Conversation]:
+    """Session turns as (unsaved) Conversation objects, newest first, like the DB query returns."""
+    return [
+        Conversation(
+            user_message=turn.get("user_message"),
+            bot_reply=turn.get("bot_reply"),
+            timestamp=datetime.fromisoformat(turn["timestamp"]) if turn.get("timestamp") else None,
+        )
+        for turn in session.get("turns") or []
+    ]
+
+
+async def record_turn(
+    user_number: str,
+    session: Optional[Dict[str, Any]],
+    user_message: str,
+    bot_reply: str,
+    service_id: Optional[str] = None,
+) -> None:
+    """Add a turn to the user's session; session is what this turn loaded, None if it did not."""
+    if session is None:
+        # History was not loaded (timeout, DB error): add to the stored session rather than
+        # overwrite it; with none stored, the next turn reads the DB (write-behind rows included)
+        session = await get_session(user_number)
+        if session is None:
+            _stats["skipped_writes"] += 1
+            return
+    session = dict(session)
+    turn = {"user_message": user_message, "bot_reply": bot_reply, "timestamp": datetime.utcnow().isoformat()}
+    session["turns"] = ([turn] + list(session.get("turns") or []))[:SESSION_HISTORY_TURNS]
+    if service_id:
+        session["service_id"] = service_id
+    await save_session(user_number, session)
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["backend"] = "shared" if state.STATE_BACKEND_URL else "local"
+    stats["local_entries"] = len(_local)
+    return stats
@@ -0,0 +1,113 @@
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+# Startup profile: import time per module and duration of each startup step, logged once the
+# app is up (also at /admin/startup). `python startup.py` profiles without serving traffic.
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "0") == "1"
+# Slowest imports listed in the report
+STARTUP_PROFILE_TOP = int(os.environ.get("STARTUP_PROFILE_TOP", "15"))
+
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+_original_import = builtins.__import__
+_main_thread = threading.get_ident()
+# module -> [total seconds including its own imports, self seconds]
+_imports: Dict[str, List[float]] = {}
+# Time spent in nested imports, one entry per import in progress
+_child_time: List[float] = []
+_steps: List[Tuple[str, float]] = []
+_marks: Dict[str, float] = {}
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only first-time absolute imports on the importing thread (warm-up threads run concurrently)
+    if level or name in sys.modules or threading.get_ident() != _main_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    _child_time.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        total = time.perf_counter() - start
+        children = _child_time.pop()
+        if _child_time:
+            _child_time[-1] += total
+        _imports[name] = [total, total - children]
+
+
+def install() -> None:
+    """Start timing imports (no-op unless STARTUP_PROFILE=1); call before the app's imports."""
+    if STARTUP_PROFILE and builtins.__import__ is _original_import:
+        builtins.__import__ = _timed_import
+
+
+def mark(name: str) -> None:
+    """Record seconds since this module was imported, e.g. mark("imported") at the end of main."""
+    _marks[name] = time.perf_counter() - _started
+
+
+@contextmanager
+def step(name: str) -> Iterator[None]:
+    """Time one initialization step of the startup hook."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _steps.append((name, time.perf_counter() - start))
+
+
+def ready() -> None:
+    """Stop timing imports and log the report (called at the end of app startup)."""
+    builtins.__import__ = _original_import
+    mark("ready")
+    if not STARTUP_PROFILE:
+        return
+    stats = get_stats()
+    lines = [f"⏱️ Startup profile: ready after {stats['marks_ms']['ready']:.0f} ms"]
+    for name, ms in stats["marks_ms"].items():
+        lines.append(f"   {name:28s} {ms:8.1f} ms")
+    lines.append("   steps:")
+    for name, ms in stats["steps_ms"].items():
+        lines.append(f"   {name:28s} {ms:8.1f} ms")
+    lines.append("   slowest imports (total / self):")
+    for name, (total_ms, self_ms) in stats["imports_ms"].items():
+        lines.append(f"   {name:28s} {total_ms:8.1f} ms {self_ms:8.1f} ms")
+    logger.warning("\n".join(lines))
+
+
+def get_stats() -> Dict[str, Any]:
+    slowest = sorted(_imports.items(), key=lambda item: item[1][0], reverse=True)[:STARTUP_PROFILE_TOP]
+    return {
+        "profile": STARTUP_PROFILE,
+        "marks_ms": {name: seconds * 1000 for name, seconds in _marks.items()},
+        "steps_ms": {name: seconds * 1000 for name, seconds in _steps},
+        "imports_ms": {name: [total * 1000, own * 1000] for name, (total, own) in slowest},
+    }
+
+
+def run() -> None:
+    import asyncio
+
+    logging.basicConfig(level=logging.WARNING)
+    import main
+
+    async def _profile() -> None:
+        await main.startup_event()
+        await main.shutdown_event()
+
+    asyncio.run(_profile())
+
+
+if __name__ == "__main__":
+    # Run from the importable module so main.py's `import startup` shares this state
+    os.environ["STARTUP_PROFILE"] = "1"
+    import startup
+
+    startup.run()
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Shared state backend for per-user data (pagination cursors, sessions, MessageSid dedup, ...).
+# Unset: in-process memory (single worker). redis://... : any Redis-protocol server (several workers).
+STATE_BACKEND_URL = os.environ.get("STATE_BACKEND_URL")
+STATE_KEY_PREFIX = os.environ.get("STATE_KEY_PREFIX", "wabot:")
+
+# Sweep expired in-memory keys once the store grows past this many entries
+_MEMORY_SWEEP_THRESHOLD = 10000
+
+
+class MemoryStore:
+    """In-process key/value store with per-key TTL."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[float, Any]] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        if len(self._data) > _MEMORY_SWEEP_THRESHOLD:
+            self._sweep()
+        # Round-trip through JSON so callers get the same copy semantics as with Redis
+        self._data[key] = (time.monotonic() + ttl, json.loads(json.dumps(value)))
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        """Set only if the key is absent (or expired); True when this call set it."""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def set_list(self, key: str, values: List[str], ttl: float) -> None:
+        """Replace key with a list of strings, read back in slices with get_range()."""
+        # Strings are immutable, so a shallow copy gives the same semantics as Redis
+        if len(self._data) > _MEMORY_SWEEP_THRESHOLD:
+            self._sweep()
+        self._data[key] = (time.monotonic() + ttl, list(values))
+
+    async def get_range(self, key: str, start: int, stop: int) -> List[str]:
+        """values[start:stop] of a list stored with set_list(); [] when the key is missing."""
+        return (await self.get(key) or [])[start:stop]
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        """Delete key only while it still holds value (e.g. a lock token); True when deleted."""
+        if await self.get(key) != value:
+            return False
+        self._data.pop(key, None)
+        return True
+
+    async def close(self) -> None:
+        self._data.clear()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+
+
+class RedisStore:
+    """Key/value store on a Redis-protocol server (Redis, Valkey, KeyDB, ...); values are JSON."""
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise ValueError("STATE_BACKEND_URL is set but the 'redis' package is not installed")
+        self._redis = redis_asyncio.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(STATE_KEY_PREFIX + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._redis.set(STATE_KEY_PREFIX + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: Any, ttl: float) -> bool:
+        return bool(await self._redis.set(STATE_KEY_PREFIX + key, json.dumps(value), px=max(1, int(ttl * 1000)), nx=True))
+
+    async def set_list(self, key: str, values: List[str], ttl: float) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(STATE_KEY_PREFIX + key)
+            if values:
+                pipe.rpush(STATE_KEY_PREFIX + key, *values)
+                pipe.pexpire(STATE_KEY_PREFIX + key, max(1, int(ttl * 1000)))
+            await pipe.execute()
+
+    async def get_range(self, key: str, start: int, stop: int) -> List[str]:
+        if stop <= start:
+            return []
+        return await self._redis.lrange(STATE_KEY_PREFIX + key, start, stop - 1)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(STATE_KEY_PREFIX + key)
+
+    async def delete_if(self, key: str, value: Any) -> bool:
+        from redis.exceptions import WatchError
+
+        name = STATE_KEY_PREFIX + key
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                # WATCH aborts the DELETE if the key changes (expires, new owner) after the read
+                await pipe.watch(name)
+                raw = await pipe.get(name)
+                if raw is None or json.loads(raw) != value:
+                    return False
+                pipe.multi()
+                pipe.delete(name)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RedisStore(STATE_BACKEND_URL) if STATE_BACKEND_URL else MemoryStore()
+    return _store
+
+
+async def close_store() -> None:
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
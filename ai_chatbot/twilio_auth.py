@@ -0,0 +1,83 @@
+import os
+from typing import Any, Dict, Mapping, Optional
+
+from fastapi import Request
+
+# Reject /whatsapp requests without a valid X-Twilio-Signature (needs TWILIO_AUTH_TOKEN).
+# 0 is for local development only (curl, ngrok tests).
+TWILIO_VALIDATE_SIGNATURE = os.environ.get("TWILIO_VALIDATE_SIGNATURE", "1") == "1"
+# Webhook URL exactly as configured in Twilio (it is part of the signature). Unset: rebuilt from
+# the request, honouring X-Forwarded-Proto/Host from the platform's TLS proxy.
+TWILIO_WEBHOOK_URL = os.environ.get("TWILIO_WEBHOOK_URL")
+
+_validator = None
+_stats: Dict[str, int] = {"validated": 0, "rejected": 0, "unchecked": 0, "wrong_recipient": 0}
+
+
+def setting(name: str) -> Optional[str]:
+    # Environment variable first (Railway), then .env file (local)
+    value = os.environ.get(name)
+    if not value:
+        try:
+            from decouple import config
+            value = config(name, default=None)
+        except Exception:
+            value = None
+    return value
+
+
+def sender_number() -> Optional[str]:
+    """Our WhatsApp number, e.g. "whatsapp:+14155238886"; the only sender used for REST replies."""
+    return setting("TWILIO_WHATSAPP_FROM")
+
+
+def signatures_checked() -> bool:
+    """Whether /whatsapp verifies signatures (enabled and a TWILIO_AUTH_TOKEN is configured)."""
+    return TWILIO_VALIDATE_SIGNATURE and bool(setting("TWILIO_AUTH_TOKEN"))
+
+
+def _get_validator():
+    global _validator
+    if _validator is None:
+        from twilio.request_validator import RequestValidator
+        _validator = RequestValidator(setting("TWILIO_AUTH_TOKEN"))
+    return _validator
+
+
+def webhook_url(request: Request) -> str:
+    if TWILIO_WEBHOOK_URL:
+        return TWILIO_WEBHOOK_URL
+    proto = request.headers.get("x-forwarded-proto", request.url.scheme).split(",")[0].strip()
+    host = request.headers.get("x-forwarded-host") or request.headers.get("host") or request.url.netloc
+    url = f"{proto}://{host}{request.url.path}"
+    return f"{url}?{request.url.query}" if request.url.query else url
+
+
+def is_from_twilio(request: Request, params: Mapping[str, Any]) -> bool:
+    """True when the request carries a valid X-Twilio-Signature (or checks are off)."""
+    if not signatures_checked():
+        _stats["unchecked"] += 1
+        return True
+    signature = request.headers.get("x-twilio-signature", "")
+    # The forwarded headers only choose the URL that is checked; they cannot forge the HMAC
+    if signature and _get_validator().validate(webhook_url(request), dict(params), signature):
+        _stats["validated"] += 1
+        return True
+    _stats["rejected"] += 1
+    return False
+
+
+def is_our_number(to_number: Optional[str]) -> bool:
+    """The webhook's To must be our configured number before it is used for anything."""
+    ours = sender_number()
+    if ours and to_number and to_number.replace(" ", "") == ours.replace(" ", ""):
+        return True
+    _stats["wrong_recipient"] += 1
+    return False
+
+
+def get_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = dict(_stats)
+    stats["signatures_checked"] = signatures_checked()
+    stats["webhook_url"] = TWILIO_WEBHOOK_URL or "from request"
+    return stats
@@ -0,0 +1,408 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sqlite3
+import time
+import zlib
+from collections import deque
+from contextlib import closing, nullcontext
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from bursts import shared_turn_lock
+from db import AsyncSessionLocal
+import metrics
+from twilio_auth import sender_number, setting
+
+logger = logging.getLogger(__name__)
+
+# Async reply mode. Unset: reply inline in the webhook response (TwiML).
+# "inprocess": the webhook queues the message for worker tasks in the same process.
+# "process": the webhook queues into a local SQLite file drained by `python workers.py`.
+ASYNC_REPLY_MODE = os.environ.get("ASYNC_REPLY_MODE", "").lower()
+# Messages processed concurrently; each user is pinned to one worker so their turns stay in order
+WORKER_COUNT = int(os.environ.get("WORKER_COUNT", "4"))
+# OS processes started by `python workers.py` (the workers are split between them)
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", str(min(WORKER_COUNT, os.cpu_count() or 1))))
+WORKER_QUEUE_PATH = os.environ.get("WORKER_QUEUE_PATH", "message_queue.db")
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "0.2"))
+WORKER_MAX_ATTEMPTS = int(os.environ.get("WORKER_MAX_ATTEMPTS", "3"))
+# How long shutdown waits for in-process workers to finish queued messages
+WORKER_DRAIN_TIMEOUT = float(os.environ.get("WORKER_DRAIN_TIMEOUT", "10"))
+# Replies sent through the REST API are not bound by Twilio's 15s webhook timeout
+ASYNC_DEADLINE_SECONDS = float(os.environ.get("ASYNC_DEADLINE_SECONDS", "30"))
+
+TWILIO_API_BASE = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com")
+TWILIO_TIMEOUT = float(os.environ.get("TWILIO_TIMEOUT", "10"))
+
+# (db session, user number, message body, deadline seconds, text to classify or None) -> reply text
+Handler = Callable[[Any, str, str, float, Optional[str]], Awaitable[str]]
+
+_QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    shard INTEGER NOT NULL,
+    user_number TEXT NOT NULL,
+    to_number TEXT,
+    body TEXT NOT NULL,
+    intent_text TEXT,
+    reply TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+)
+"""
+
+_handler: Optional[Handler] = None
+_queue = None
+_workers: List["asyncio.Task[None]"] = []
+_twilio_client: Optional[httpx.AsyncClient] = None
+_stats: Dict[str, Any] = {
+    "enqueued": 0,
+    "processed": 0,
+    "merged": 0,
+    "sent": 0,
+    "retries": 0,
+    "failed": 0,
+    "max_wait_seconds": 0.0,
+}
+
+
+def shard_for(user_number: str) -> int:
+    # Stable across processes and restarts, unlike hash()
+    return zlib.crc32(user_number.encode("utf-8"))
+
+
+def _job(user_number: str, to_number: Optional[str], body: str) -> Dict[str, Any]:
+    return {
+        "id": None,
+        "shard": shard_for(user_number),
+        "user_number": user_number,
+        "to_number": to_number,
+        "body": body,
+        "intent_text": None,
+        "reply": None,
+        "attempts": 0,
+        "created_at": time.time(),
+    }
+
+
+def _merge(job: Dict[str, Any], following: List[Dict[str, Any]]) -> None:
+    # Messages the user sent while this one waited become one turn; the newest drives intents
+    if following:
+        job["body"] = "\n".join([job["body"]] + [j["body"] for j in following])
+        job["intent_text"] = following[-1]["body"]
+
+
+class MemoryQueue:
+    """One FIFO lane per worker; a user always lands on the same one."""
+
+    def __init__(self, workers: int):
+        self._lanes: List[Deque[Dict[str, Any]]] = [deque() for _ in range(workers)]
+        self._ready = [asyncio.Event() for _ in range(workers)]
+        self._unfinished = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def put(self, job: Dict[str, Any]) -> None:
+        lane = job["shard"] % len(self._lanes)
+        self._lanes[lane].append(job)
+        self._ready[lane].set()
+        self._unfinished += 1
+        self._idle.clear()
+
+    async def get(self, worker: int, workers: int) -> Dict[str, Any]:
+        lane = self._lanes[worker]
+        while not lane:
+            self._ready[worker].clear()
+            await self._ready[worker].wait()
+        return lane.popleft()
+
+    async def merge_following(self, job: Dict[str, Any]) -> int:
+        lane = self._lanes[job["shard"] % len(self._lanes)]
+        following = [j for j in lane if j["user_number"] == job["user_number"]]
+        for j in following:
+            lane.remove(j)
+        self._unfinished -= len(following)
+        _merge(job, following)
+        return len(following)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        pass
+
+    async def done(self, job: Dict[str, Any]) -> None:
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._idle.set()
+
+    async def join(self) -> None:
+        await self._idle.wait()
+
+    def depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes)
+
+
+class SQLiteQueue:
+    """Durable local queue shared by the web process and `python workers.py`.
+
+    A job stays at the head of its worker's lane until it is sent or gives up, so per-user
+    order survives retries and restarts. The reply is stored before sending, so a retry
+    after a Twilio error resends instead of running the pipeline twice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_QUEUE_SCHEMA)
+            # Queue files created before merged jobs kept the text to classify
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "intent_text" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN intent_text TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _put(self, job: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (shard, user_number, to_number, body, attempts, created_at) VALUES (?, ?, ?, ?, 0, ?)",
+                (job["shard"], job["user_number"], job["to_number"], job["body"], job["created_at"]),
+            )
+
+    def _head(self, worker: int, workers: int) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE shard % ? = ? ORDER BY id LIMIT 1", (workers, worker)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def _merge_following(self, job: Dict[str, Any]) -> int:
+        # Fold the user's later queued messages into this job in one transaction
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE shard = ? AND user_number = ? AND id > ? ORDER BY id",
+                (job["shard"], job["user_number"], job["id"]),
+            ).fetchall()
+            if not rows:
+                return 0
+            _merge(job, [dict(row) for row in rows])
+            # Persist both, so a merged job is classified the same way after a restart
+            conn.execute(
+                "UPDATE jobs SET body = ?, intent_text = ? WHERE id = ?", (job["body"], job["intent_text"], job["id"])
+            )
+            conn.execute(
+                f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(rows))})", [row["id"] for row in rows]
+            )
+        return len(rows)
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("UPDATE jobs SET reply = ?, attempts = ? WHERE id = ?", (job["reply"], job["attempts"], job["id"]))
+
+    def _delete(self, job: Dict[str, Any]) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job["id"],))
+
+    async def put(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._put, job)
+
+    async def get(self, worker: int, workers: int) -> Dict[str, Any]:
+        while True:
+            job = await asyncio.to_thread(self._head, worker, workers)
+            if job is not None:
+                return job
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+    async def merge_following(self, job: Dict[str, Any]) -> int:
+        return await asyncio.to_thread(self._merge_following, job)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._save, job)
+
+    async def done(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._delete, job)
+
+    def depth(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+def _twilio_http() -> httpx.AsyncClient:
+    global _twilio_client
+    if _twilio_client is None:
+        _twilio_client = httpx.AsyncClient(base_url=TWILIO_API_BASE, timeout=TWILIO_TIMEOUT)
+    return _twilio_client
+
+
+def _require_twilio_settings() -> None:
+    if not (setting("TWILIO_ACCOUNT_SID") and setting("TWILIO_AUTH_TOKEN") and sender_number()):
+        raise ValueError("TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_FROM are required in async reply mode")
+
+
+async def send_message(to_number: str, body: str) -> None:
+    """Send a WhatsApp message from our configured number through the Twilio Messages REST API."""
+    _require_twilio_settings()
+    account_sid = setting("TWILIO_ACCOUNT_SID")
+    auth_token = setting("TWILIO_AUTH_TOKEN")
+    sender = sender_number()
+    resp = await _twilio_http().post(
+        f"/2010-04-01/Accounts/{account_sid}/Messages.json",
+        data={"To": to_number, "From": sender, "Body": body},
+        auth=(account_sid, auth_token),
+    )
+    resp.raise_for_status()
+
+
+async def _answer(job: Dict[str, Any]) -> str:
+    assert _handler is not None
+    # In-process lanes are per web worker; the shared lock keeps a user's turns on different
+    # workers from overlapping (`python workers.py` pins each user to one lane already)
+    lock = shared_turn_lock(job["user_number"]) if isinstance(_queue, MemoryQueue) else nullcontext()
+    with metrics.timed("worker_answer"):
+        async with lock, AsyncSessionLocal() as db:
+            return await _handler(db, job["user_number"], job["body"], ASYNC_DEADLINE_SECONDS, job.get("intent_text"))
+
+
+async def _deliver(queue, job: Dict[str, Any]) -> None:
+    wait = time.time() - job["created_at"]
+    _stats["max_wait_seconds"] = max(_stats["max_wait_seconds"], wait)
+    while True:
+        try:
+            if job["reply"] is None:
+                _stats["merged"] += await queue.merge_following(job)
+                job["reply"] = await _answer(job)
+                _stats["processed"] += 1
+                await queue.save(job)
+            await send_message(job["user_number"], job["reply"])
+            _stats["sent"] += 1
+            return
+        except Exception as e:
+            job["attempts"] += 1
+            await queue.save(job)
+            if job["attempts"] >= WORKER_MAX_ATTEMPTS:
+                _stats["failed"] += 1
+                logger.error("❌ Giving up on message from %s after %s attempts: %s", job['user_number'], job['attempts'], e)
+                return
+            _stats["retries"] += 1
+            logger.warning("⚠️ Message from %s failed (attempt %s): %s", job['user_number'], job['attempts'], e)
+            await asyncio.sleep(min(2 ** job["attempts"], 30))
+
+
+async def _worker_loop(queue, worker: int, workers: int) -> None:
+    while True:
+        job = await queue.get(worker, workers)
+        await _deliver(queue, job)
+        # Not reached when cancelled mid-job, so a queued job is retried after a restart
+        await queue.done(job)
+
+
+def _start_workers(queue, worker_ids: List[int]) -> None:
+    for worker in worker_ids:
+        _workers.append(asyncio.ensure_future(_worker_loop(queue, worker, WORKER_COUNT)))
+
+
+async def enqueue(user_number: str, to_number: Optional[str], body: str) -> None:
+    """Queue an incoming message; the reply is sent later through the Twilio REST API."""
+    await _queue.put(_job(user_number, to_number, body))
+    _stats["enqueued"] += 1
+
+
+async def start(handler: Handler) -> None:
+    """Set up the queue for ASYNC_REPLY_MODE (app startup); in-process mode also starts the workers."""
+    global _handler, _queue
+    _handler = handler
+    if ASYNC_REPLY_MODE in ("inprocess", "process"):
+        # Fail at startup rather than on every queued reply
+        _require_twilio_settings()
+    if ASYNC_REPLY_MODE == "inprocess":
+        _queue = MemoryQueue(WORKER_COUNT)
+        _start_workers(_queue, list(range(WORKER_COUNT)))
+    elif ASYNC_REPLY_MODE == "process":
+        _queue = SQLiteQueue(WORKER_QUEUE_PATH)
+    elif ASYNC_REPLY_MODE:
+        raise ValueError(f"Unknown ASYNC_REPLY_MODE {ASYNC_REPLY_MODE!r} (use 'inprocess' or 'process')")
+
+
+async def stop() -> None:
+    """Let in-process workers finish what is queued (bounded), then cancel them."""
+    global _twilio_client
+    if isinstance(_queue, MemoryQueue) and _workers:
+        try:
+            await asyncio.wait_for(_queue.join(), WORKER_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error("Shutting down with %s queued messages unanswered", _queue.depth())
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    if _twilio_client is not None:
+        await _twilio_client.aclose()
+        _twilio_client = None
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    stats["mode"] = ASYNC_REPLY_MODE or "inline"
+    stats["workers"] = WORKER_COUNT
+    stats["queued"] = _queue.depth() if _queue is not None else 0
+    return stats
+
+
+async def _serve(worker_ids: List[int]) -> None:
+    # Same startup/shutdown as the web app (HTTP pools, write-behind queue, ...), minus HTTP
+    import main
+
+    global _handler, _queue
+    await main.startup_event()
+    _handler = main.answer_message
+    _queue = SQLiteQueue(WORKER_QUEUE_PATH)
+    _start_workers(_queue, worker_ids)
+    logger.info("👷 Workers %s draining %s", worker_ids, WORKER_QUEUE_PATH)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+    await main.shutdown_event()
+
+
+def _run_process(worker_ids: List[int]) -> None:
+    asyncio.run(_serve(worker_ids))
+
+
+def run(argv: Optional[List[str]] = None) -> None:
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="Drain the local message queue (ASYNC_REPLY_MODE=process)")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    args = parser.parse_args(argv)
+    processes = max(1, min(args.processes, WORKER_COUNT))
+    # Worker i handles the users with shard % WORKER_COUNT == i; process p runs workers p, p+P, ...
+    groups = [list(range(p, WORKER_COUNT, processes)) for p in range(processes)]
+    if processes == 1:
+        _run_process(groups[0])
+        return
+    children = [multiprocessing.Process(target=_run_process, args=(group,)) for group in groups]
+    for child in children:
+        child.start()
+    # Graceful restart: pass SIGTERM on so every child finishes its shutdown
+    signal.signal(signal.SIGTERM, lambda *_: [child.terminate() for child in children])
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.join()
+
+
+if __name__ == "__main__":
+    # Run from the importable module so main.py's `import workers` shares this state
+    import workers
+
+    workers.run()